@@ -1,144 +1,319 @@
-from fastapi import APIRouter, status, Request
-from fastapi.responses import JSONResponse, StreamingResponse
-from pathlib import Path
-import json
-import uuid
+from fastapi import APIRouter, Depends, status, Request
+from sse_starlette.sse import EventSourceResponse
+import asyncio
+import os
+from functools import lru_cache
+from contextlib import asynccontextmanager
+from concurrent.futures import Executor
+from typing import Optional
 
-from google.genai.errors import ServerError
+import msgspec
+import orjson
+from anyio import to_thread
 
 from app.schemas.feature_api_schemas import *
 from app.utils.logget_setup import app_logger
+from app.utils.orjson_response import json_response
+from app.utils._fast import _classify_relevance
+from app.utils.sse import sse_frame
 from app.core.configs.app_config import system_config, REPO_STORAGE, settings
-from app.services.github.code_analyzer import build_file_index, chunk_files, run_analysis_stream
-from app.services.agents.agent_config import agent_manager, memory_store, tool_registry, session_manager
+from app.services.github.code_analyzer import build_file_index, chunk_files, repo_snapshot_key, run_analysis_stream
+from app.services.agents.agent_config import agent_manager
 from app.services.ai_search.search_service import gemini_search_engine
 from app.core.rate_limiter import limiter, ANALYSIS_LIMIT, SEARCH_LIMIT
+from app.core.user_context import current_user_id
 
 STATUS_SUCCESS = system_config.get("STATUS_SUCCESS", "success")
 STATUS_FAILURE = system_config.get("STATUS_FAILURE", "failure")
-app_logger.debug("API_KEY:")
-app_logger.debug(settings.GOOGLE_API_KEY)
+SSE_PING_INTERVAL = system_config.get("SSE_PING_INTERVAL", 15)
+
+
+@lru_cache(maxsize=1024)
+def _user_dirs(user_id: str) -> tuple[str, str, str]:
+    """
+    Storage layout is fixed per user, so build (user_base, chunks_base, index_base)
+    and create the folders once per user.
+    """
+    user_base = os.path.join(str(REPO_STORAGE), user_id)
+    chunks_base = os.path.join(user_base, "chunks")
+    index_base = os.path.join(user_base, "indexed_file")
+    os.makedirs(chunks_base, exist_ok=True)
+    os.makedirs(index_base, exist_ok=True)
+    return user_base, chunks_base, index_base
 
 router = APIRouter()
 
+
+# Serializes the whole file index as JSON lines in one msgspec call
+_INDEX_ENCODER = msgspec.json.Encoder()
+
+# Per-(user_id, folder_id) locks so concurrent requests don't index/chunk the same repo twice.
+# Each entry is [lock, holders + waiters] and is dropped once nobody uses it.
+_folder_locks: dict[tuple[str, str], list] = {}
+
+# In-flight analyses keyed by (user_id, folder_id) -> subscriber queues
+_inflight: dict[tuple[str, str], list[asyncio.Queue]] = {}
+_inflight_tasks: set[asyncio.Task] = set()
+_DONE = object()
+
+# SSE batching window (seconds): shrinks while batches stay single, grows while they fill up
+_BATCH_WINDOW_INITIAL = 0.01
+_BATCH_WINDOW_MAX = 0.05
+_BATCH_MAX_EVENTS = 32
+_BATCH_SINGLE_ROUNDS = 4
+
+
+@asynccontextmanager
+async def _folder_lock(user_id: str, folder_id: str):
+    key = (user_id, folder_id)
+    entry = _folder_locks.get(key)
+    if entry is None:
+        entry = _folder_locks[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _folder_locks[key]
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _read_jsonl(path: str) -> list:
+    with open(path, "rb") as f:
+        return [orjson.loads(line) for line in f if line.strip()]
+
+
+def _write_jsonl(path: str, records):
+    """Write one JSON document per line so peak memory stays at one record."""
+    with open(path, "wb") as f:
+        for record in records:
+            f.write(orjson.dumps(record))
+            f.write(b"\n")
+
+
+def _load_cached_chunks(chunk_file_path: str, indexed_file_path: str, key_file_path: str, snapshot_key: str):
+    """
+    Return (indexed_files, chunked_data) persisted by a previous run if the
+    repository snapshot key still matches, otherwise None.
+    """
+    try:
+        if _read_bytes(key_file_path).decode("utf-8") != snapshot_key:
+            return None
+        return _read_jsonl(indexed_file_path), _read_jsonl(chunk_file_path)
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+
+def _parse_document(document):
+    """Chunk documents are stored as JSON strings; already-parsed dicts pass through."""
+    if not isinstance(document, str):
+        return document
+    try:
+        return orjson.loads(document)
+    except orjson.JSONDecodeError:
+        return {"raw_content": document}
+
+
+def _persist(chunk_file_path: str, chunked_data: list, indexed_file_path: str, indexed_file: list[FileInfo], key_file_path: str, snapshot_key: str):
+    """Write chunk data, file index and snapshot key in one worker-thread hop."""
+    _write_jsonl(chunk_file_path, chunked_data)
+    with open(indexed_file_path, "wb") as f:
+        f.write(_INDEX_ENCODER.encode_lines(indexed_file))
+    with open(key_file_path, "w", encoding="utf-8") as f:
+        f.write(snapshot_key)
+
+
+async def _run_cpu(pool: Optional[Executor], func, *args):
+    """Run CPU-bound work in the app's process pool, or a worker thread when no pool is set up."""
+    if pool is None:
+        return await to_thread.run_sync(func, *args)
+    return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+
+
+async def _analysis_pipeline(user_id: str, folder_ids: str, pool: Optional[Executor]):
+    """
+    Index, chunk and analyze one folder, yielding event dicts as it goes.
+    Errors are yielded as {"event": "error", ...} rather than raised.
+    
+    Indexing and chunking are CPU-bound and run in the app's process pool
+    (worker threads if the app has none, e.g. without the lifespan).
+    """
+    try:
+        user_base, chunks_base, index_base = _user_dirs(user_id)
+        file_path = os.path.join(user_base, folder_ids)
+        chunk_file_path = os.path.join(chunks_base, f"chunk_{folder_ids}.jsonl")
+        indexed_file_path = os.path.join(index_base, f"file_index_{folder_ids}.jsonl")
+        key_file_path = os.path.join(chunks_base, f"chunk_{folder_ids}.key")
+        
+        yield {'event': 'progress', 'stage': 'init', 'percent': 0, 'message': 'Creating analysis agent...'}
+        
+        analysis_agent = agent_manager.create(name="Analysis_Agent", model=settings.FLASH_MODEL, instruction="", description="Analysis Agent")
+        
+        async with _folder_lock(user_id, folder_ids):
+            snapshot_key = await to_thread.run_sync(repo_snapshot_key, file_path)
+            cached = await to_thread.run_sync(_load_cached_chunks, chunk_file_path, indexed_file_path, key_file_path, snapshot_key)
+            
+            if cached:
+                indexed_files, chunked_data = cached
+                yield {'event': 'progress', 'stage': 'chunking', 'percent': 5, 'message': f'Repository unchanged. Reusing index of {len(indexed_files)} files...'}
+            else:
+                yield {'event': 'progress', 'stage': 'indexing', 'percent': 2, 'message': 'Indexing repository files...'}
+                
+                indexed_file = await _run_cpu(pool, build_file_index, file_path)
+                if len(indexed_file) == 0:
+                    yield {'event': 'error', 'code': 'NO_FILES', 'message': 'No files found for analysis.'}
+                    return
+                
+                yield {'event': 'progress', 'stage': 'chunking', 'percent': 5, 'message': f'Found {len(indexed_file)} files. Creating chunks...'}
+                
+                chunked_data = await _run_cpu(pool, chunk_files, file_path, indexed_file)
+                await to_thread.run_sync(_persist, chunk_file_path, chunked_data, indexed_file_path, indexed_file, key_file_path, snapshot_key)
+        
+        chunked_ids = [chunk.get("chunk_id") for chunk in chunked_data]
+        
+        yield {'event': 'progress', 'stage': 'analyzing', 'percent': 5, 'message': f'Created {len(chunked_ids)} chunks. Starting analysis...'}
+        
+        async for event in run_analysis_stream(agent=analysis_agent, folder_id=folder_ids, user_id=user_id, chunk_ids=chunked_ids):
+            yield event
+            
+            if event.get('event') == 'error':
+                return
+    
+    except Exception as e:
+        app_logger.exception("Analysis pipeline error: %s", e)
+        yield {'event': 'error', 'message': 'An unexpected error occurred.'}
+
+
+async def _broadcast(key: tuple[str, str], subscribers: list[asyncio.Queue], pool: Optional[Executor]):
+    """Run the pipeline once and fan every event out to the current subscribers."""
+    try:
+        async for event in _analysis_pipeline(*key, pool):
+            for queue in subscribers:
+                queue.put_nowait(event)
+    finally:
+        _inflight.pop(key, None)
+        for queue in subscribers:
+            queue.put_nowait(_DONE)
+
+
+async def _drain_batches(queue: asyncio.Queue):
+    """
+    Yield lists of events from a subscriber queue until _DONE, coalescing
+    events that arrive within the current window into one batch.
+    """
+    window = _BATCH_WINDOW_INITIAL
+    single_rounds = 0
+    
+    while (event := await queue.get()) is not _DONE:
+        batch = [event]
+        done = False
+        while len(batch) < _BATCH_MAX_EVENTS:
+            try:
+                event = queue.get_nowait() if window == 0 else await asyncio.wait_for(queue.get(), timeout=window)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if event is _DONE:
+                done = True
+                break
+            batch.append(event)
+        
+        yield batch
+        if done:
+            return
+        
+        # Adapt: idle streams flush immediately, busy streams wait a little longer
+        if len(batch) == 1:
+            single_rounds += 1
+            if single_rounds >= _BATCH_SINGLE_ROUNDS:
+                window = 0
+        else:
+            single_rounds = 0
+            if len(batch) == _BATCH_MAX_EVENTS:
+                window = min(max(window * 2, _BATCH_WINDOW_INITIAL), _BATCH_WINDOW_MAX)
+
+
+async def _subscribe_analysis(user_id: str, folder_id: str, pool: Optional[Executor], batched: bool = False):
+    """
+    Yield analysis events for a folder. Concurrent callers for the same folder
+    share one pipeline run instead of each starting their own.
+    
+    With batched=True, yields lists of events coalesced by _drain_batches.
+    """
+    key = (user_id, folder_id)
+    queue: asyncio.Queue = asyncio.Queue()
+    subscribers = _inflight.get(key)
+    if subscribers is None:
+        subscribers = _inflight[key] = []
+        subscribers.append(queue)
+        task = asyncio.create_task(_broadcast(key, subscribers, pool))
+        _inflight_tasks.add(task)
+        task.add_done_callback(_inflight_tasks.discard)
+    else:
+        app_logger.info(f"Joining in-flight analysis for folder {folder_id}")
+        subscribers.append(queue)
+    
+    try:
+        if batched:
+            async for batch in _drain_batches(queue):
+                yield batch
+        else:
+            while (event := await queue.get()) is not _DONE:
+                yield event
+    finally:
+        if queue in subscribers:
+            subscribers.remove(queue)
+
+
 @router.post("/analysis/stream")
 @limiter.limit(ANALYSIS_LIMIT)
-async def analyze_repo_stream(request: Request, request_data: AnalysisRequest):
+async def analyze_repo_stream(request: Request, request_data: AnalysisRequest, user_id: str = Depends(current_user_id)):
     """SSE endpoint for analysis with real-time progress updates."""
-    user_id = "918262"
     folder_ids = request_data.folder_ids[0]
     
     async def generate_events():
-        try:
-            file_path = str(REPO_STORAGE / f"{user_id}" / f"{folder_ids}")
-            
-            chunk_file_path = Path(REPO_STORAGE) / str(user_id) / "chunks" / f"chunk_{folder_ids}.json"
-            chunk_file_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            indexed_file_path = Path(REPO_STORAGE) / str(user_id) / "indexed_file" / f"file_index_{folder_ids}.json"
-            indexed_file_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            yield f"event: progress\ndata: {json.dumps({'stage': 'init', 'percent': 0, 'message': 'Creating analysis agent...'})}\n\n"
-            
-            analysis_agent = agent_manager.create(name="Analysis_Agent", model=settings.FLASH_MODEL, instruction="", description="Analysis Agent")
-            
-            yield f"event: progress\ndata: {json.dumps({'stage': 'indexing', 'percent': 2, 'message': 'Indexing repository files...'})}\n\n"
-            
-            indexed_file = build_file_index(file_path)
-            if len(indexed_file) == 0:
-                yield f"event: error\ndata: {json.dumps({'message': 'No files found for analysis.'})}\n\n"
-                return
-            
-            yield f"event: progress\ndata: {json.dumps({'stage': 'chunking', 'percent': 5, 'message': f'Found {len(indexed_file)} files. Creating chunks...'})}\n\n"
-            
-            chunked_data = chunk_files(file_path, indexed_file)
-            
-            indexed_files = [
-                f.model_dump(exclude_none=True, by_alias=True) if hasattr(f, "model_dump") else f
-                for f in indexed_file
-            ]
-            
-            chunk_file_path.write_text(json.dumps(chunked_data, indent=2), encoding="utf-8")
-            indexed_file_path.write_text(json.dumps(indexed_files, indent=2), encoding="utf-8")
-            
-            chunked_ids = [chunk.get("chunk_id") for chunk in chunked_data]
-            
-            yield f"event: progress\ndata: {json.dumps({'stage': 'analyzing', 'percent': 5, 'message': f'Created {len(chunked_ids)} chunks. Starting analysis...'})}\n\n"
-            
-            async for event in run_analysis_stream(agent=analysis_agent, folder_id=folder_ids, user_id=user_id, chunk_ids=chunked_ids):
-                yield f"event: {event.get('event', 'progress')}\ndata: {json.dumps(event)}\n\n"
-                
-                if event.get('event') == 'error':
-                    return
-        
-        except Exception as e:
-            app_logger.exception("SSE stream error: %s", e)
-            yield f"event: error\ndata: {json.dumps({'message': 'An unexpected error occurred.'})}\n\n"
+        async for batch in _subscribe_analysis(user_id, folder_ids, getattr(request.app.state, "pool", None), batched=True):
+            if len(batch) == 1:
+                yield sse_frame(batch[0].get("event", "progress"), batch[0])
+            else:
+                yield sse_frame("progress_batch", batch)
     
-    return StreamingResponse(
-        generate_events(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
+    return EventSourceResponse(generate_events(), ping=SSE_PING_INTERVAL)
 
 @router.post("/analysis")
 @limiter.limit(ANALYSIS_LIMIT)
-async def analyze_repo(request: Request, request_data: AnalysisRequest):
+async def analyze_repo(request: Request, request_data: AnalysisRequest, user_id: str = Depends(current_user_id)):
     """Non-streaming analysis endpoint (legacy)."""
     try:
-        user_id = "918262"
         folder_ids = request_data.folder_ids[0]
-        file_path = str(REPO_STORAGE / f"{user_id}" / f"{folder_ids}")
-        
-        chunk_file_path = Path(REPO_STORAGE) / str(user_id) / "chunks" / f"chunk_{folder_ids}.json"
-        chunk_file_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        indexed_file_path = Path(REPO_STORAGE) / str(user_id) / "indexed_file" / f"file_index_{folder_ids}.json"
-        indexed_file_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        analysis_agent = agent_manager.create(name="Analysis_Agent", model=settings.FLASH_MODEL, instruction="", description="Analysis Agent")
-        
-        indexed_file = build_file_index(file_path)
-        if len(indexed_file) == 0:
-            response = {"status": STATUS_FAILURE, "message": "No files found for analysis.", "data": []}
-            return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content=response)
-        
-        chunked_data = chunk_files(file_path, indexed_file)
-        
-        indexed_files = [
-            f.model_dump(exclude_none=True, by_alias=True) if hasattr(f, "model_dump") else f
-            for f in indexed_file
-        ]
-        
-        chunk_file_path.write_text(json.dumps(chunked_data, indent=2), encoding="utf-8")
-        indexed_file_path.write_text(json.dumps(indexed_files, indent=2), encoding="utf-8")
-        
-        chunked_ids = [chunk.get("chunk_id") for chunk in chunked_data]
         
         # Consume all events and check final status
         final_event = None
-        async for event in run_analysis_stream(agent=analysis_agent, folder_id=folder_ids, user_id=user_id, chunk_ids=chunked_ids):
+        async for event in _subscribe_analysis(user_id, folder_ids, getattr(request.app.state, "pool", None)):
             final_event = event
         
         if final_event and final_event.get("event") == "error":
             response = {"status": STATUS_FAILURE, "message": final_event.get("message", "Analysis failed"), "data": []}
-            return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content=response)
+            if final_event.get("code") == "NO_FILES":
+                return json_response(response, status_code=status.HTTP_404_NOT_FOUND)
+            return json_response(response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         response = {"status": STATUS_SUCCESS, "message": "Analysis Completed!", "data": []}
-        return JSONResponse(status_code=status.HTTP_200_OK, content=response)
+        return json_response(response, status_code=status.HTTP_200_OK)
     
     except Exception as e:
         app_logger.exception("Error while analyzing repository: %s", e)
         response = {"status": STATUS_FAILURE, "message": "Analysis Failed! Please try again later!", "data": []}
-        return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content=response)
+        return json_response(response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
 @router.post("/q", response_model=SearchResponse)
 @limiter.limit(SEARCH_LIMIT)
-async def search_indexed_docs(request: Request, request_data: SearchRequest):
+async def search_indexed_docs(request: Request, request_data: SearchRequest, user_id: str = Depends(current_user_id)):
     """
     Search through indexed document chunks using semantic similarity.
     
@@ -149,28 +324,18 @@ async def search_indexed_docs(request: Request, request_data: SearchRequest):
         SearchResponse with matching document chunks and similarity scores
     """
     try:
-        user_id = "918262"
         query = request_data.query.strip()
         
         app_logger.info(
             f"Search request - User: {user_id}, "
             f"Query: '{query[:50]}...'"
         )
-        gemini_search_engine.load()
-        
-        if not gemini_search_engine:
-            app_logger.error("Gemini search engine not initialized properly.")
-            response = {
-                "status": STATUS_FAILURE,
-                "message": "Search service is currently unavailable. Please try again later.",
-                "data": [],
-                "total_results": 0,
-                "query": query
-            }
-            return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=response)
+        # Loaded from disk on the first search only; no-op afterwards
+        await to_thread.run_sync(gemini_search_engine.ensure_loaded)
         
-        # Validate that index exists
-        if gemini_search_engine.index.ntotal == 0:
+        # Validate that index exists (one size read for the whole request)
+        doc_count = len(gemini_search_engine)
+        if doc_count == 0:
             app_logger.warning(f"Search attempted on empty index. No documents indexed yet.")
             response = {
                 "status": STATUS_SUCCESS,
@@ -179,7 +344,7 @@ async def search_indexed_docs(request: Request, request_data: SearchRequest):
                 "total_results": 0,
                 "query": query
             }
-            return JSONResponse(status_code=status.HTTP_200_OK, content=response)
+            return json_response(response, status_code=status.HTTP_200_OK)
         
         # Perform semantic search
         search_results = gemini_search_engine.search(query)
@@ -193,33 +358,18 @@ async def search_indexed_docs(request: Request, request_data: SearchRequest):
                 "total_results": 0,
                 "query": query
             }
-            return JSONResponse(status_code=status.HTTP_200_OK, content=response)
+            return json_response(response, status_code=status.HTTP_200_OK)
         
         # Format results with relevance classification
-        formatted_results = []
-        for result in search_results:
-            # Classify relevance based on distance score
-            # Lower distance = higher relevance (L2 distance)
-            distance = result["score"]
-            if distance < 0.5:
-                relevance = "high"
-            elif distance < 1.0:
-                relevance = "medium"
-            else:
-                relevance = "low"
-            
-            # Parse the document content (it's stored as JSON string)
-            try:
-                content = json.loads(result["document"]) if isinstance(result["document"], str) else result["document"]
-            except json.JSONDecodeError:
-                content = {"raw_content": result["document"]}
-            
-            formatted_results.append({
+        formatted_results = [
+            {
                 "chunk_id": result["id"],
-                "score": round(distance, 4),
-                "content": content,
-                "relevance": relevance
-            })
+                "score": round(result["score"], 4),
+                "content": _parse_document(result["document"]),
+                "relevance": _classify_relevance(result["score"])
+            }
+            for result in search_results
+        ]
         
         app_logger.info(f"Search completed - Found {len(formatted_results)} results")
         
@@ -231,7 +381,7 @@ async def search_indexed_docs(request: Request, request_data: SearchRequest):
             "query": query
         }
         
-        return JSONResponse(status_code=status.HTTP_200_OK, content=response)
+        return json_response(response, status_code=status.HTTP_200_OK)
     
     except ValueError as e:
         # Handle validation errors (empty query, invalid parameters)
@@ -243,7 +393,7 @@ async def search_indexed_docs(request: Request, request_data: SearchRequest):
             "total_results": 0,
             "query": request_data.query
         }
-        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=response)
+        return json_response(response, status_code=status.HTTP_400_BAD_REQUEST)
     
     except Exception as e:
         app_logger.exception("Error during search: %s", e)
@@ -254,4 +404,4 @@ async def search_indexed_docs(request: Request, request_data: SearchRequest):
             "total_results": 0,
             "query": request_data.query if request_data else ""
         }
-        return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content=response)
+        return json_response(response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
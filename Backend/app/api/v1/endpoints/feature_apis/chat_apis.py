@@ -1,12 +1,16 @@
-from fastapi import APIRouter, status, Request
-from fastapi.responses import StreamingResponse
-import json
+from fastapi import APIRouter, Depends, status, Request
+from sse_starlette.sse import EventSourceResponse
 import time
 
 from app.schemas.feature_api_schemas import ChatRequest
 from app.utils.logget_setup import app_logger
+from app.utils.sse import sse_frame
 from app.services.chat.chat_service import ChatService
+from app.core.configs.app_config import system_config
 from app.core.rate_limiter import limiter, CHAT_LIMIT
+from app.core.user_context import current_user_id
+
+SSE_PING_INTERVAL = system_config.get("SSE_PING_INTERVAL", 15)
 
 router = APIRouter()
 
@@ -17,7 +21,7 @@ chat_service = ChatService()
 
 @router.post("/chat/stream", status_code=status.HTTP_200_OK)
 @limiter.limit(CHAT_LIMIT)
-async def chat_with_agent_stream(request: Request, request_data: ChatRequest):
+async def chat_with_agent_stream(request: Request, request_data: ChatRequest, user_id: str = Depends(current_user_id)):
     """
     SSE streaming chat endpoint for real-time agent responses.
     
@@ -35,9 +39,9 @@ async def chat_with_agent_stream(request: Request, request_data: ChatRequest):
     - The session_id is returned in the 'complete' event for frontend to store and reuse
     - To start a new session, simply send an empty session_id
     """
-    app_logger.info(f"Stream chat request: user_id={request_data.user_id}, session_id={request_data.session_id}")
+    # Sessions and agent tools share the resolved identity; request_data.user_id is not trusted
+    app_logger.info(f"Stream chat request: user_id={user_id}, session_id={request_data.session_id}")
     
-    user_id = request_data.user_id or "anonymous"
     folder_id = request_data.folder_id or "default"
     
     # Generate session_id if not provided (new session)
@@ -57,24 +61,16 @@ async def chat_with_agent_stream(request: Request, request_data: ChatRequest):
                 session_id=session_id,
                 folder_id=request_data.folder_id
             ):
-                # Format as SSE
-                event_type = event.get("event", "message")
-                data = event.get("data", {})
-                yield f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+                # Pre-encoded SSE frame, passed through untouched by EventSourceResponse
+                yield sse_frame(event.get("event", "message"), event.get("data", {}))
                 
         except Exception as e:
             app_logger.error(f"Stream error: {str(e)}")
-            error_data = {"message": str(e)}
-            yield f"event: error\ndata: {json.dumps(error_data)}\n\n"
+            yield sse_frame("error", {"message": str(e)})
     
-    return StreamingResponse(
+    return EventSourceResponse(
         event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-            "X-Chat-Session-Id": session_id
-        }
+        ping=SSE_PING_INTERVAL,
+        headers={"X-Chat-Session-Id": session_id}
     )
 
@@ -2,59 +2,95 @@
 API endpoint for downloading a repository as a ZIP file.
 """
 import io
+import os
 import zipfile
 from pathlib import Path
+from typing import Iterator
 
-from fastapi import APIRouter, status
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import StreamingResponse
 
 from app.utils.logget_setup import app_logger
+from app.utils.orjson_response import json_response
+from app.utils._fast import _walk
 from app.core.configs.app_config import system_config, REPO_STORAGE, helper_config
 from app.schemas.feature_api_schemas import ExplorerRequest
+from app.core.user_context import current_user_id
 
 STATUS_SUCCESS = system_config.get("STATUS_SUCCESS", "success")
 STATUS_FAILURE = system_config.get("STATUS_FAILURE", "failure")
-IGNORE_DIRS = helper_config.get("default_ignore", [".git", "__pycache__", "node_modules"])
+IGNORE_DIRS = frozenset(helper_config.get("default_ignore", [".git", "__pycache__", "node_modules"]))
+STORAGE_RESOLVED = REPO_STORAGE.resolve()
+
+# Source text compresses nearly as well at level 1 as at the default 6, for a fraction of the CPU
+ZIP_COMPRESS_LEVEL = 1
+# Already-compressed formats gain nothing from DEFLATE, so they are stored as-is
+STORED_EXTENSIONS = frozenset({
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".whl", ".jar",
+    ".woff", ".woff2", ".mp3", ".mp4", ".pdf",
+})
 
 router = APIRouter()
 
 
-def create_zip_from_directory(directory: Path) -> io.BytesIO:
+class _ZipChunkWriter(io.RawIOBase):
+    """
+    Unseekable sink for ZipFile that buffers written bytes until drained.
+    
+    ZipFile falls back to data descriptors when the target cannot seek,
+    so each member can be handed to the client as soon as it is compressed.
     """
-    Create an in-memory ZIP archive from a directory.
+    
+    def __init__(self):
+        self._buffer = bytearray()
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        self._buffer.extend(data)
+        return len(data)
+    
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def iter_zip_from_directory(directory: Path) -> Iterator[bytes]:
+    """
+    Stream a ZIP archive of a directory, one compressed file at a time.
     
     Args:
         directory: Path to the directory to zip
         
-    Returns:
-        BytesIO object containing the ZIP file
+    Yields:
+        Chunks of the ZIP archive as bytes
     """
-    zip_buffer = io.BytesIO()
+    sink = _ZipChunkWriter()
     
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        for file_path in directory.rglob("*"):
-            # Skip ignored directories
-            relative_path = file_path.relative_to(directory)
-            parts = relative_path.parts
-            
-            # Check if any part of the path is in IGNORE_DIRS
-            if any(part in IGNORE_DIRS or part.startswith(".") for part in parts):
-                continue
-            
-            # Only add files (directories are created automatically)
-            if file_path.is_file():
-                arcname = str(relative_path)
-                try:
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED, compresslevel=ZIP_COMPRESS_LEVEL) as zip_file:
+        # Only files are yielded (directories are created automatically)
+        for file_path, arcname in _walk(str(directory), IGNORE_DIRS):
+            try:
+                if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+                    zip_file.write(file_path, arcname, compress_type=zipfile.ZIP_STORED)
+                else:
                     zip_file.write(file_path, arcname)
-                except Exception as e:
-                    app_logger.warning(f"Could not add {file_path} to zip: {e}")
+            except Exception as e:
+                app_logger.warning(f"Could not add {file_path} to zip: {e}")
+            
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
     
-    zip_buffer.seek(0)
-    return zip_buffer
+    # Central directory is written when the archive is closed
+    yield sink.drain()
 
 
 @router.post("/download/repo")
-async def download_repo(request_data: ExplorerRequest):
+async def download_repo(request_data: ExplorerRequest, user_id: str = Depends(current_user_id)):
     """
     Download a repository as a ZIP file.
     
@@ -65,41 +101,37 @@ async def download_repo(request_data: ExplorerRequest):
         StreamingResponse with the ZIP file
     """
     try:
-        user_id = "918262"  # Hardcoded for now, should come from auth
         folder_id = request_data.folder_id
         
         repo_path = REPO_STORAGE / user_id / folder_id
         
         if not repo_path.exists() or not repo_path.is_dir():
             app_logger.warning(f"Repository not found: {repo_path}")
-            return JSONResponse(
-                status_code=status.HTTP_404_NOT_FOUND,
-                content={
+            return json_response(
+                {
                     "status": STATUS_FAILURE,
                     "message": "Repository not found. Please analyze the repository first.",
                     "data": None
-                }
+                },
+                status_code=status.HTTP_404_NOT_FOUND
             )
         
         # Security check: Ensure path is within REPO_STORAGE
         try:
-            resolved_path = repo_path.resolve()
-            storage_resolved = REPO_STORAGE.resolve()
-            if not str(resolved_path).startswith(str(storage_resolved)):
+            if not repo_path.resolve().is_relative_to(STORAGE_RESOLVED):
                 raise ValueError("Path traversal attempt")
         except Exception:
-            return JSONResponse(
-                status_code=status.HTTP_403_FORBIDDEN,
-                content={
+            return json_response(
+                {
                     "status": STATUS_FAILURE,
                     "message": "Invalid folder ID.",
                     "data": None
-                }
+                },
+                status_code=status.HTTP_403_FORBIDDEN
             )
         
-        # Create ZIP archive
-        app_logger.info(f"Creating ZIP archive for {folder_id}")
-        zip_buffer = create_zip_from_directory(repo_path)
+        # Stream ZIP archive (StreamingResponse iterates sync generators in a threadpool)
+        app_logger.info(f"Streaming ZIP archive for {folder_id}")
         
         # Generate a meaningful filename
         zip_filename = f"repo_{folder_id}.zip"
@@ -107,7 +139,7 @@ async def download_repo(request_data: ExplorerRequest):
         app_logger.info(f"Sending ZIP archive: {zip_filename}")
         
         return StreamingResponse(
-            zip_buffer,
+            iter_zip_from_directory(repo_path),
             media_type="application/zip",
             headers={
                 "Content-Disposition": f'attachment; filename="{zip_filename}"'
@@ -116,11 +148,11 @@ async def download_repo(request_data: ExplorerRequest):
     
     except Exception as e:
         app_logger.exception(f"Error downloading repository: {e}")
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={
+        return json_response(
+            {
                 "status": STATUS_FAILURE,
                 "message": "Failed to create repository archive.",
                 "data": None
-            }
+            },
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
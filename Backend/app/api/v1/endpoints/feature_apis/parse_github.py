@@ -1,24 +1,26 @@
-import json
-from fastapi import APIRouter, status, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+from fastapi import APIRouter, Depends, Request
+from sse_starlette.sse import EventSourceResponse
 from app.schemas.feature_api_schemas import ParseGithubUrl
 from app.utils.logget_setup import app_logger
+from app.utils.sse import sse_frame
 from app.services.github.parser import extract_github_info_with_error
 
 from app.services.github.clone_stream import clone_with_progress
+from app.services.github._inflight import single_flight
 from app.services.github.metadata import fetch_repo_metadata, fetch_branch_count
+from app.core.configs.app_config import system_config
 from app.core.rate_limiter import limiter, CLONE_LIMIT
+from app.core.user_context import current_user_id
 
-router = APIRouter()
-
-
-
+SSE_PING_INTERVAL = system_config.get("SSE_PING_INTERVAL", 15)
 
+router = APIRouter()
 
 
 @router.post("/parse_github_url/stream")
 @limiter.limit(CLONE_LIMIT)
-async def parse_github_url_stream(request: Request, request_data: ParseGithubUrl):
+async def parse_github_url_stream(request: Request, request_data: ParseGithubUrl, user_id: str = Depends(current_user_id)):
     """
     SSE endpoint for parsing and cloning with progress streaming.
     
@@ -28,7 +30,6 @@ async def parse_github_url_stream(request: Request, request_data: ParseGithubUrl
     - event: complete, data: {...clone info...}
     - event: error, data: {"message": "..."}
     """
-    user_id = "918262"
     url = request_data.github_repo
     
     async def generate_events():
@@ -36,24 +37,28 @@ async def parse_github_url_stream(request: Request, request_data: ParseGithubUrl
             # Use parser with error messages for user-friendly feedback
             parsed, error_msg = extract_github_info_with_error(url)
             if not parsed:
-                yield f"event: error\ndata: {json.dumps({'event': 'error', 'message': error_msg, 'code': 'INVALID_URL'})}\n\n"
+                yield sse_frame("error", {'event': 'error', 'message': error_msg, 'code': 'INVALID_URL'})
                 return
             
-            yield f"event: progress\ndata: {json.dumps({'stage': 'metadata', 'percent': 5, 'message': 'Fetching repository info...'})}\n\n"
+            yield sse_frame("progress", {'stage': 'metadata', 'percent': 5, 'message': 'Fetching repository info...'})
             
             owner = parsed.get("owner")
             repo = parsed.get("repo")
             
-            try:
-                metadata = await fetch_repo_metadata(owner, repo)
-                branch_count = await fetch_branch_count(owner, repo)
-            except Exception as meta_err:
+            # Independent GitHub calls: overlap them so we wait for the slower one only
+            metadata, branch_count = await asyncio.gather(
+                fetch_repo_metadata(owner, repo),
+                fetch_branch_count(owner, repo),
+                return_exceptions=True
+            )
+            meta_err = next((r for r in (metadata, branch_count) if isinstance(r, Exception)), None)
+            if meta_err is not None:
                 app_logger.error(f"Failed to fetch metadata: {meta_err}")
-                yield f"event: error\ndata: {json.dumps({'event': 'error', 'message': 'Failed to fetch repository info. The repo may not exist or be private.', 'code': 'METADATA_FAILED'})}\n\n"
+                yield sse_frame("error", {'event': 'error', 'message': 'Failed to fetch repository info. The repo may not exist or be private.', 'code': 'METADATA_FAILED'})
                 return
             
             if metadata is None:
-                yield f"event: error\ndata: {json.dumps({'event': 'error', 'message': f'Repository not found: {owner}/{repo}. Please check the URL.', 'code': 'REPO_NOT_FOUND'})}\n\n"
+                yield sse_frame("error", {'event': 'error', 'message': f'Repository not found: {owner}/{repo}. Please check the URL.', 'code': 'REPO_NOT_FOUND'})
                 return
             
             # Merge metadata
@@ -63,29 +68,22 @@ async def parse_github_url_stream(request: Request, request_data: ParseGithubUrl
             parsed["description"] = metadata.get("description", "")
             parsed["is_private"] = metadata.get("is_private", False)
             parsed["updated_at"] = metadata.get("updated_at")
-            parsed["branches"] = branch_count
+            parsed["branches"] = branch_count or 0  # None: branch lookup failed
             
             # Send metadata to frontend
-            yield f"event: metadata\ndata: {json.dumps(parsed)}\n\n"
+            yield sse_frame("metadata", parsed)
             
-            # Stream clone progress
-            async for progress_event in clone_with_progress(url, user_id):
+            # Stream clone progress; a retry or reconnect for the same URL joins the running clone
+            async for progress_event in single_flight((user_id, url), lambda: clone_with_progress(url, user_id)):
                 event_type = progress_event.get("event", "progress")
-                yield f"event: {event_type}\ndata: {json.dumps(progress_event)}\n\n"
+                yield sse_frame(event_type, progress_event)
                 
                 if event_type == "error":
                     return
                     
         except Exception as e:
             app_logger.exception("SSE stream error: %s", e)
-            yield f"event: error\ndata: {json.dumps({'event': 'error', 'message': 'An unexpected error occurred. Please try again.', 'code': 'INTERNAL_ERROR'})}\n\n"
+            yield sse_frame("error", {'event': 'error', 'message': 'An unexpected error occurred. Please try again.', 'code': 'INTERNAL_ERROR'})
     
-    return StreamingResponse(
-        generate_events(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"  # Disable nginx buffering
-        }
-    )
+    # EventSourceResponse sets no-cache/keep-alive/X-Accel-Buffering and pings idle streams
+    return EventSourceResponse(generate_events(), ping=SSE_PING_INTERVAL)
@@ -1,61 +1,126 @@
-from fastapi import APIRouter, status, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, status, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import codecs
+import os
+from functools import lru_cache
 from pathlib import Path
 from pydantic import BaseModel
 from typing import Optional
 
+import anyio
+import orjson
+
 from app.utils.logget_setup import app_logger
+from app.utils.orjson_response import ORJSONResponse
 from app.core.configs.app_config import system_config, REPO_STORAGE, helper_config
-from app.schemas.feature_api_schemas import FileNode, ExplorerRequest, ContentRequest
+from app.schemas.feature_api_schemas import ExplorerRequest, ContentRequest
 from app.core.rate_limiter import limiter, EXPLORER_LIMIT
+from app.core.user_context import current_user_id
 
 STATUS_SUCCESS = system_config.get("STATUS_SUCCESS", "success")
 STATUS_FAILURE = system_config.get("STATUS_FAILURE", "failure")
-IGNORE_EXTS = helper_config.get("ignore_extensions")
-IGNORE_DIRS = helper_config.get("default_ignore")
+IGNORE_EXTS = tuple(helper_config.get("ignore_extensions"))
+IGNORE_DIRS = frozenset(helper_config.get("default_ignore"))
+
+# Storage root is fixed at startup, so resolve it once for the path-traversal guard
+_REPO_STORAGE_RESOLVED = str(REPO_STORAGE.resolve()) + os.sep
+
+# Files above this size are streamed instead of read into one string
+CONTENT_INLINE_LIMIT = 64 * 1024
+CONTENT_STREAM_CHUNK = 64 * 1024
+MAX_EXPLORER_FILE_BYTES = helper_config.get("explorer_max_file_bytes", 2 * 1024 * 1024)
+SOFT_LIMIT_BYTES = helper_config.get("explorer_soft_limit_bytes", 1024 * 1024)
+# A NUL byte in the first block marks a file as binary
+BINARY_SNIFF_BYTES = 512
+BINARY_PLACEHOLDER = "[Binary content cannot be displayed]"
+# Envelope up to and including the opening quote of "data"
+_CONTENT_PREFIX = orjson.dumps({"status": STATUS_SUCCESS, "message": "File content retrieved.", "data": ""})[:-2]
 
 router = APIRouter()
 
 
-def build_tree(directory: Path, base_path: Path) -> list[FileNode]:
+def build_tree(directory: Path, base_path: Path) -> list[dict]:
     """
-    Recursively build a file tree from a directory.
+    Build a file tree from a directory with an iterative os.scandir walk.
+    
+    Nodes are plain dicts shaped like FileNode, ready to serialize.
     """
-    nodes = []
-    try:
-        for item in sorted(directory.iterdir(), key=lambda x: (x.is_file(), x.name.lower())):
-            relative_path = str(item.relative_to(base_path)).replace("\\", "/")
-            
-            # Skip hidden files/folders and common non-essential directories
-            if item.name.startswith(".") or item.name in IGNORE_DIRS or item.name.endswith(tuple(IGNORE_EXTS)):
-                continue
-            
-            if item.is_dir():
-                children = build_tree(item, base_path)
-                nodes.append(FileNode(
-                    name=item.name,
-                    path=relative_path,
-                    type="directory",
-                    children=children
-                ))
-            else:
-                nodes.append(FileNode(
-                    name=item.name,
-                    path=relative_path,
-                    type="file",
-                    children=None
-                ))
-    except PermissionError:
-        app_logger.warning(f"Permission denied accessing: {directory}")
-    except Exception as e:
-        app_logger.error(f"Error building tree for {directory}: {e}")
+    base_len = len(str(base_path)) + 1
+    nodes: list[dict] = []
+    stack = [(str(directory), nodes)]
+    
+    while stack:
+        current, siblings = stack.pop()
+        level = []
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    name = entry.name
+                    
+                    # Skip hidden files/folders and common non-essential directories
+                    if name[0] == "." or name in IGNORE_DIRS or name.endswith(IGNORE_EXTS):
+                        continue
+                    
+                    relative_path = entry.path[base_len:].replace("\\", "/")
+                    # d_type from scandir: no stat, and reused as the sort key below
+                    if entry.is_dir(follow_symlinks=False):
+                        node = {"name": name, "path": relative_path, "type": "directory", "children": []}
+                        stack.append((entry.path, node["children"]))
+                        level.append((True, name.lower(), node))
+                    else:
+                        level.append((False, name.lower(), {"name": name, "path": relative_path, "type": "file", "children": None}))
+        except PermissionError:
+            app_logger.warning(f"Permission denied accessing: {current}")
+        except Exception as e:
+            app_logger.error(f"Error building tree for {current}: {e}")
+        
+        # Directories first, then case-insensitive by name
+        level.sort(key=lambda item: (not item[0], item[1]))
+        siblings.extend(node for _, _, node in level)
     
     return nodes
 
 
+async def _iter_content_json(path: Path, limit: int, truncated: bool):
+    """
+    Stream up to `limit` bytes of a file as the usual {"status", "message", "data"}
+    JSON envelope, escaping the text chunk by chunk. Invalid UTF-8 is replaced,
+    not rejected. Adds "truncated": true when the file was cut short.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    yield _CONTENT_PREFIX
+    async with await anyio.open_file(path, "rb") as f:
+        while limit > 0 and (chunk := await f.read(min(CONTENT_STREAM_CHUNK, limit))):
+            limit -= len(chunk)
+            text = decoder.decode(chunk)
+            if text:
+                yield orjson.dumps(text)[1:-1]
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield orjson.dumps(tail)[1:-1]
+    yield b'","truncated":true}' if truncated else b'"}'
+
+
+def _is_binary(path: Path) -> bool:
+    """Sniff the head of a file for NUL bytes instead of decoding the whole thing."""
+    with open(path, "rb") as f:
+        return b"\x00" in f.read(BINARY_SNIFF_BYTES)
+
+
+@lru_cache(maxsize=256)
+def _build_tree_cached(user_id: str, folder_id: str, mtime_ns: int) -> list[dict]:
+    """
+    Serialized tree for a repo, keyed by the repo root's mtime so a
+    re-clone (which recreates the folder) misses the cache.
+    """
+    repo_path = REPO_STORAGE / user_id / folder_id
+    return build_tree(repo_path, repo_path)
+
+
 @router.post("/explorer/tree")
 @limiter.limit(EXPLORER_LIMIT)
-async def get_repo_tree(request: Request, request_data: ExplorerRequest):
+async def get_repo_tree(request: Request, request_data: ExplorerRequest, user_id: str = Depends(current_user_id)):
     """
     Get the file tree structure for an analyzed repository.
     
@@ -66,14 +131,13 @@ async def get_repo_tree(request: Request, request_data: ExplorerRequest):
         JSON tree structure of the repository
     """
     try:
-        user_id = "918262"  # Hardcoded for now, should come from auth
         folder_id = request_data.folder_id
         
         repo_path = REPO_STORAGE / user_id / folder_id
         
         if not repo_path.exists():
             app_logger.warning(f"Repository not found: {repo_path}")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_404_NOT_FOUND,
                 content={
                     "status": STATUS_FAILURE,
@@ -82,22 +146,22 @@ async def get_repo_tree(request: Request, request_data: ExplorerRequest):
                 }
             )
         
-        tree = build_tree(repo_path, repo_path)
+        tree = _build_tree_cached(user_id, folder_id, repo_path.stat().st_mtime_ns)
         
         app_logger.info(f"File tree built for {folder_id} with {len(tree)} top-level items")
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 "status": STATUS_SUCCESS,
                 "message": "File tree retrieved successfully.",
-                "data": [node.model_dump() for node in tree]
+                "data": tree
             }
         )
     
     except Exception as e:
         app_logger.exception(f"Error getting repo tree: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "status": STATUS_FAILURE,
@@ -109,26 +173,26 @@ async def get_repo_tree(request: Request, request_data: ExplorerRequest):
 
 @router.post("/explorer/content")
 @limiter.limit(EXPLORER_LIMIT)
-async def get_file_content(request: Request, request_data: ContentRequest):
+async def get_file_content(request: Request, request_data: ContentRequest, user_id: str = Depends(current_user_id)):
     """
     Get the content of a specific file in the repository.
     """
     try:
-        user_id = "918262"
         folder_id = request_data.folder_id
         file_path = request_data.file_path.lstrip("/") # Remove leading slash if present
         
-        repo_root = REPO_STORAGE / user_id / folder_id
-        target_file = repo_root / file_path
-        
-        # Security check: Ensure file is within repo root
+        # Security check: Ensure file is within repo root.
+        # Lexical check first (no syscalls), then one realpath so symlinks inside the repo can't escape it.
         try:
-            target_file = target_file.resolve()
-            repo_root = repo_root.resolve()
-            if not str(target_file).startswith(str(repo_root)):
+            repo_prefix = os.path.normpath(os.path.join(_REPO_STORAGE_RESOLVED, user_id, folder_id)) + os.sep
+            candidate = os.path.normpath(repo_prefix + file_path)
+            if not repo_prefix.startswith(_REPO_STORAGE_RESOLVED) or not candidate.startswith(repo_prefix):
                 raise ValueError("Path traversal attempt")
+            if not os.path.realpath(candidate).startswith(repo_prefix):
+                raise ValueError("Path traversal attempt")
+            target_file = Path(candidate)
         except Exception:
-             return JSONResponse(
+             return ORJSONResponse(
                 status_code=status.HTTP_403_FORBIDDEN,
                 content={
                     "status": STATUS_FAILURE,
@@ -138,7 +202,7 @@ async def get_file_content(request: Request, request_data: ContentRequest):
             )
 
         if not target_file.exists() or not target_file.is_file():
-             return JSONResponse(
+             return ORJSONResponse(
                 status_code=status.HTTP_404_NOT_FOUND,
                 content={
                     "status": STATUS_FAILURE,
@@ -147,14 +211,44 @@ async def get_file_content(request: Request, request_data: ContentRequest):
                 }
             )
             
+        size = target_file.stat().st_size
+        if size > MAX_EXPLORER_FILE_BYTES:
+            return ORJSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={
+                    "status": STATUS_FAILURE,
+                    "message": "File too large to display",
+                    "data": None,
+                    "size": size
+                }
+            )
+        
+        if await asyncio.to_thread(_is_binary, target_file):
+            return ORJSONResponse(
+                status_code=status.HTTP_200_OK,
+                content={
+                    "status": STATUS_SUCCESS,
+                    "message": "File content retrieved.",
+                    "data": BINARY_PLACEHOLDER
+                }
+            )
+        
+        # Large files are streamed so neither the event loop nor memory holds the whole file
+        if size > CONTENT_INLINE_LIMIT:
+            return StreamingResponse(
+                _iter_content_json(target_file, min(size, SOFT_LIMIT_BYTES), size > SOFT_LIMIT_BYTES),
+                media_type="application/json",
+                headers={"X-Accel-Buffering": "no"}
+            )
+        
         # Read content
         try:
-            content = target_file.read_text(encoding="utf-8")
+            content = await asyncio.to_thread(target_file.read_text, encoding="utf-8")
         except UnicodeDecodeError:
             # Fallback for non-utf8 files (basic binary handling or skip)
             content = "[Binary or non-UTF-8 content cannot be displayed]"
             
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 "status": STATUS_SUCCESS,
@@ -165,7 +259,7 @@ async def get_file_content(request: Request, request_data: ContentRequest):
 
     except Exception as e:
         app_logger.exception(f"Error reading file {request_data.file_path}: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "status": STATUS_FAILURE,
@@ -1,7 +1,6 @@
 import os
-import re
+from functools import lru_cache
 import yaml
-from yaml.nodes import ScalarNode
 from pathlib import Path
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
@@ -26,11 +25,19 @@ settings = Settings()
 
 def load_yaml_config(file_path: str) -> dict:
     """
-    Load a YAML config file and resolve !Env tags safely.
+    Load a YAML config file with yaml.safe_load.
+    Parsed results are memoized until the file's mtime changes.
     """
-    if not os.path.exists(file_path):
+    try:
+        mtime_ns = os.stat(file_path).st_mtime_ns
+    except FileNotFoundError:
         raise FileNotFoundError(f"Config file not found: {file_path}")
 
+    return _load_yaml_cached(file_path, mtime_ns)
+
+
+@lru_cache(maxsize=32)
+def _load_yaml_cached(file_path: str, mtime_ns: int) -> dict:
     with open(file_path, encoding="utf-8") as f:
         return yaml.safe_load(f) or {}
 
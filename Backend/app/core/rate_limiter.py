@@ -9,10 +9,10 @@ from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi import Request
-from fastapi.responses import JSONResponse
 
 from app.core.configs.app_config import system_config
 from app.utils.logget_setup import app_logger
+from app.utils.orjson_response import ORJSONResponse
 
 
 # Rate limit configurations (per day per IP)
@@ -49,7 +49,7 @@ def get_client_ip(request: Request) -> str:
 limiter = Limiter(key_func=get_client_ip)
 
 
-def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> JSONResponse:
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> ORJSONResponse:
     """
     Custom handler for rate limit exceeded errors.
     Returns a user-friendly JSON response.
@@ -57,7 +57,7 @@ def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> JSO
     client_ip = get_client_ip(request)
     app_logger.warning(f"[RATE_LIMIT] Rate limit exceeded for IP: {client_ip}, endpoint: {request.url.path}")
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=429,
         content={
             "status": "failure",
@@ -0,0 +1,51 @@
+"""
+Request user identity for SurfaceLabs API
+
+Resolves the caller's user id, used to partition REPO_STORAGE and to key
+per-user caches. The id only ever comes from `request.state.user_id`, set by
+auth middleware. Deployments without auth run single-tenant under
+DEFAULT_USER_ID from system_config.yaml; with neither, requests are rejected.
+Client-controlled values (headers, body fields, client IP) are never used.
+"""
+
+import re
+from contextvars import ContextVar
+
+from fastapi import HTTPException, Request, status
+
+from app.core.configs.app_config import system_config
+
+
+# Single-tenant id for deployments without auth middleware (None: require auth)
+DEFAULT_USER_ID = system_config.get("DEFAULT_USER_ID")
+
+# The id becomes a REPO_STORAGE path component
+_USER_ID_RE = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+
+# Visible to code running inside the request (e.g. agent tools) that has no Request
+_current_user_id: ContextVar[str] = ContextVar("current_user_id", default="anonymous")
+
+
+async def current_user_id(request: Request) -> str:
+    """
+    FastAPI dependency returning the caller's user id.
+    Async so the context variable is set in the request's own context.
+
+    Raises:
+        HTTPException: 401 when no authenticated (or configured default) user exists
+    """
+    user_id = getattr(request.state, "user_id", None) or DEFAULT_USER_ID
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication required.")
+
+    user_id = str(user_id)
+    if not _USER_ID_RE.match(user_id):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user identity.")
+
+    _current_user_id.set(user_id)
+    return user_id
+
+
+def get_current_user_id() -> str:
+    """User id of the request being served, or "anonymous" outside a request."""
+    return _current_user_id.get()
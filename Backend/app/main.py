@@ -1,27 +1,42 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
-from app.core.configs.app_config import settings
+from app.core.configs.app_config import settings, system_config
 from app.utils.logget_setup import app_logger as logger
 from app.api.v1.router import api_router
 from app.core.rate_limiter import limiter, rate_limit_exceeded_handler
+from app.utils.orjson_response import ORJSONResponse
+
+
+ANALYSIS_WORKERS = system_config.get("ANALYSIS_WORKERS", min(4, os.cpu_count() or 1))
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting app...")
     logger.info("Rate limiting enabled (in-memory, per-IP, per-day limits)")
+    # CPU-bound indexing/chunking runs here so it doesn't hold the GIL of the serving process.
+    # Spawned, not forked: forking this already-threaded process can deadlock, and would copy any loaded index.
+    app.state.pool = ProcessPoolExecutor(
+        max_workers=ANALYSIS_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
     yield
     logger.info("Shutting down...")
+    app.state.pool.shutdown(wait=False, cancel_futures=True)
 
 
 app = FastAPI(
     title=settings.APP_NAME,
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Add rate limiter to app state
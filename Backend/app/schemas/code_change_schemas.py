@@ -5,12 +5,14 @@ These schemas define the format for code changes that the Feature Generation
 agent produces. Similar to GitHub's unified diff format with file paths and line numbers.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import Field
 from typing import List, Optional, Literal
 from datetime import datetime
 
+from app.schemas.schema_classes import FrozenModel
 
-class CodeHunk(BaseModel):
+
+class CodeHunk(FrozenModel):
     """A single block of code changes within a file."""
     start_line: int = Field(..., description="Starting line number in the original file")
     end_line: int = Field(..., description="Ending line number in the original file")
@@ -19,7 +21,7 @@ class CodeHunk(BaseModel):
     diff: str = Field(default="", description="Unified diff format (@@ -x,y +x,y @@)")
 
 
-class FileChange(BaseModel):
+class FileChange(FrozenModel):
     """Changes to a single file."""
     file_path: str = Field(..., description="Relative path to the file")
     action: Literal["modify", "create", "delete"] = Field(..., description="Type of change")
@@ -28,7 +30,7 @@ class FileChange(BaseModel):
     full_content: Optional[str] = Field(None, description="Full file content (for new files)")
 
 
-class CodeChangeResponse(BaseModel):
+class CodeChangeResponse(FrozenModel):
     """Complete response from Feature Generation agent with structured changes."""
     summary: str = Field(..., description="High-level summary of all changes")
     changes: List[FileChange] = Field(default_factory=list, description="List of file changes")
@@ -37,13 +39,13 @@ class CodeChangeResponse(BaseModel):
     breaking_changes: List[str] = Field(default_factory=list, description="Any breaking changes introduced")
 
 
-class AnsweringResponse(BaseModel):
+class AnsweringResponse(FrozenModel):
     """Response from Answering agent (no structured changes)."""
     answer: str = Field(..., description="The explanation/answer text")
     references: List[str] = Field(default_factory=list, description="File paths referenced")
     
 
-class ChatAgentResponse(BaseModel):
+class ChatAgentResponse(FrozenModel):
     """
     Unified response format that can contain either:
     - A simple answer (from answering_agent)
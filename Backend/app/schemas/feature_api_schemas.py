@@ -1,14 +1,22 @@
-from pydantic import BaseModel, Field
+from pydantic import Field
 from typing_extensions import List, Dict, Optional
 from datetime import datetime
 
-class ParseGithubUrl(BaseModel):
+import msgspec
+
+from app.schemas.schema_classes import FrozenModel
+
+class ParseGithubUrl(FrozenModel):
     github_repo: str
     
-class AnalysisRequest(BaseModel):
+class AnalysisRequest(FrozenModel):
     folder_ids: List[str] = Field(..., description="List of folder IDs to analyze")
     
-class FileInfo(BaseModel):
+# ---- Internal pipeline records ----
+# Built from trusted code paths (filesystem scan, parsed agent output), so they
+# are msgspec Structs rather than validated models.
+
+class FileInfo(msgspec.Struct, frozen=True, gc=False):
     path: str
     relative_path: str
     size: int
@@ -18,7 +26,7 @@ class FileInfo(BaseModel):
     hash: str
 
 
-class FileChunk(BaseModel):
+class FileChunk(msgspec.Struct, frozen=True):
     """Group of related files for analysis"""
     chunk_id: str
     directory: str
@@ -26,17 +34,17 @@ class FileChunk(BaseModel):
     token_estimate: int
 
 
-class ChunkSummary(BaseModel):
+class ChunkSummary(msgspec.Struct, frozen=True):
     """AI analysis result for a chunk"""
     chunk_id: str
     directory: str
     purpose: str
-    key_files: List[Dict[str, str]]  # [{file: purpose}, ...]
+    key_files: Dict[str, str]  # {file: purpose}
     dependencies: List[str]
     patterns: List[str]
 
 
-class ProjectOverview(BaseModel):
+class ProjectOverview(msgspec.Struct, frozen=True):
     """Final synthesized project understanding"""
     project_name: str
     tech_stack: List[str]
@@ -49,21 +57,21 @@ class ProjectOverview(BaseModel):
     total_files: int
     total_lines: int
     languages: Dict[str, int]
-    analyzed_at: datetime = Field(default_factory=datetime.utcnow)
+    analyzed_at: datetime = msgspec.field(default_factory=datetime.utcnow)
     
     
-class SearchRequest(BaseModel):
+class SearchRequest(FrozenModel):
     query: str = Field(..., min_length=1, description="Search query text")
 
 
-class SearchResultItem(BaseModel):
+class SearchResultItem(FrozenModel):
     chunk_id: str
     score: float
     content: dict
     relevance: str  # "high", "medium", "low"
 
 
-class SearchResponse(BaseModel):
+class SearchResponse(FrozenModel):
     status: str
     message: str
     data: List[SearchResultItem]
@@ -73,15 +81,15 @@ class SearchResponse(BaseModel):
 
 # ============ Chat API Schemas ============
 
-class ChatRequest(BaseModel):
+class ChatRequest(FrozenModel):
     """Request schema for chat endpoint"""
     query: str = Field(..., min_length=1, description="User's query or message")
-    user_id: Optional[str] = Field(None, description="User identifier")
+    user_id: Optional[str] = Field(None, description="Ignored; the user is resolved server-side from auth")
     session_id: Optional[str] = Field(None, description="Session identifier for conversation continuity")
     folder_id: Optional[str] = Field(None, description="Repository folder ID for context")
 
 
-class ChatResponse(BaseModel):
+class ChatResponse(FrozenModel):
     """Response schema for chat endpoint"""
     status: str
     message: str
@@ -90,17 +98,17 @@ class ChatResponse(BaseModel):
 
 # ============ Repo Explorer API Schemas ============
 
-class ExplorerRequest(BaseModel):
+class ExplorerRequest(FrozenModel):
     folder_id: str
 
 
-class FileNode(BaseModel):
+class FileNode(FrozenModel):
     name: str
     path: str
     type: str
     children: Optional[list["FileNode"]] = None
 
 
-class ContentRequest(BaseModel):
+class ContentRequest(FrozenModel):
     folder_id: str
     file_path: str
\ No newline at end of file
@@ -1,17 +1,39 @@
 import re
 
-def check_only_script_tag(v):
-    pattern = re.compile(r'(?i)<\s*/?\s*script\b[^>]*>')
+from pydantic import BaseModel, ConfigDict
+
+# google-re2 (optional) matches in linear time, so long or adversarial fields can't backtrack
+try:
+    import re2 as _script_re_engine
+except ImportError:
+    _script_re_engine = re
+
 
-    if isinstance(v, list):
-        return [check_only_script_tag(item) for item in v]
+class FrozenModel(BaseModel):
+    """
+    Base for request/response schemas. Instances are never mutated after
+    validation, so they are frozen; the core schema is built at import.
+    """
+    model_config = ConfigDict(frozen=True, defer_build=False)
 
-    if isinstance(v, dict):
-        return {k: check_only_script_tag(val) for k, val in v.items()}
 
-    if isinstance(v, str):
-        if pattern.search(v):
-            raise ValueError("Invalid syntax -> script")
-        return v
+_SCRIPT_RE = _script_re_engine.compile(r'(?i)<\s*/?\s*script\b[^>]*>')
+
+
+def check_only_script_tag(v):
+    """
+    Reject <script> tags anywhere in a (possibly nested) value; returns v unchanged.
+    Walks lists/dicts with an explicit stack, and only runs the regex on strings containing '<'.
+    """
+    stack = [v]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            if "<" in item and _SCRIPT_RE.search(item):
+                raise ValueError("Invalid syntax -> script")
+        elif isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, dict):
+            stack.extend(item.values())
 
     return v
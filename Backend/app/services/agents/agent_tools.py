@@ -5,23 +5,87 @@ These are callable functions that agents can invoke to interact
 with the system (search, file retrieval, etc.)
 """
 
-import json
-import uuid
+import asyncio
+import mmap
+import os
+import posixpath
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import lru_cache
+from itertools import islice
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 
+import numpy as np
+import orjson
+
 from app.utils.logget_setup import ai_logger
-from app.services.ai_search.search_service import gemini_search_engine
-from app.core.configs.app_config import REPO_STORAGE
+from app.utils._fast import _walk
+from app.services.ai_search.search_service import GeminiSearchEngine, gemini_search_engine
+from app.core.configs.app_config import REPO_STORAGE, helper_config
+from app.core.user_context import get_current_user_id
+
+
+# Per-user storage dirs that hold pipeline output rather than cloned repos
+_NON_REPO_DIRS = frozenset({"chunks", "indexed_file", "llm_response"})
+_INDEX_IGNORE_DIRS = frozenset(helper_config.get("default_ignore", [".git", "__pycache__", "node_modules"]))
+
+
+def _iter_repo_dirs(repo_storage: Path):
+    """
+    Yield cloned repo directory paths (str) under a user's storage.
+    d_type from scandir, no stat and no Path object per entry.
+    """
+    with os.scandir(repo_storage) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and entry.name not in _NON_REPO_DIRS:
+                yield entry.path
+
 
+# Recently used per-folder engines stay resident, so switching folders doesn't re-read from disk
+INDEX_CACHE_SIZE = 4
+# folder_id -> (engine, faiss.index mtime_ns when loaded); a re-analysis rewrites the file
+_index_cache: "OrderedDict[str | None, tuple[GeminiSearchEngine, int]]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+# Engine the tools search in the current request; the shared default engine otherwise
+_active_engine: ContextVar[GeminiSearchEngine] = ContextVar("active_engine", default=gemini_search_engine)
+
+
+def _index_mtime(folder_id: str | None) -> int | None:
+    try:
+        return (GeminiSearchEngine.storage_dir(folder_id) / "faiss.index").stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_cached_index(folder_id: str | None) -> Optional[GeminiSearchEngine]:
+    """
+    Return the resident engine for a folder (marking it most recently used),
+    or None if it isn't cached or its index file changed since it was loaded.
+    """
+    mtime = _index_mtime(folder_id)
+    with _index_cache_lock:
+        cached = _index_cache.get(folder_id)
+        if cached is None or cached[1] != mtime:
+            return None
+        _index_cache.move_to_end(folder_id)
+        return cached[0]
+
+
+def _engine() -> GeminiSearchEngine:
+    return _active_engine.get()
 
-# Track currently loaded folder_id to avoid reloading same index
-_current_folder_id: str | None = None
 
 def load_index_for_folder(folder_id: str | None = None) -> bool:
     """
-    Load the FAISS index for a specific folder.
-    If already loaded for this folder, returns True without reloading.
+    Load the FAISS index for a specific folder and make it the one the
+    tools search for the rest of this request.
+    If the folder's index is still cached, returns True without reloading.
     
     Args:
         folder_id: The folder ID to load index for. If None, loads default global index.
@@ -29,26 +93,217 @@ def load_index_for_folder(folder_id: str | None = None) -> bool:
     Returns:
         True if index loaded successfully, False otherwise.
     """
-    global _current_folder_id
-    
-    # Skip if already loaded for this folder
-    if _current_folder_id == folder_id and len(gemini_search_engine) > 0:
+    engine = get_cached_index(folder_id)
+    if engine is not None and len(engine) > 0:
         ai_logger.debug(f"[INDEX] Already loaded for folder_id={folder_id}")
+        _active_engine.set(engine)
         return True
     
     ai_logger.debug(f"[INDEX] Loading index for folder_id={folder_id}")
-    success = gemini_search_engine.load(folder_id)
+    mtime = _index_mtime(folder_id)
+    engine = GeminiSearchEngine()
+    success = engine.load(folder_id)
     
     if success:
-        _current_folder_id = folder_id
-        ai_logger.debug(f"[INDEX] Loaded {len(gemini_search_engine)} documents for folder_id={folder_id}")
+        with _index_cache_lock:
+            _index_cache[folder_id] = (engine, mtime)
+            _index_cache.move_to_end(folder_id)
+            while len(_index_cache) > INDEX_CACHE_SIZE:
+                _index_cache.popitem(last=False)
+        _active_engine.set(engine)
+        ai_logger.debug(f"[INDEX] Loaded {len(engine)} documents for folder_id={folder_id}")
     else:
         ai_logger.warning(f"[INDEX] No index found for folder_id={folder_id}")
-        _current_folder_id = None
+        _active_engine.set(gemini_search_engine)
         
     return success
 
 
+# --- Semantic query cache for search_index ---
+
+QUERY_CACHE_MAXSIZE = 256
+QUERY_CACHE_TTL = 300  # seconds
+QUERY_CACHE_HIT_SIMILARITY = 0.95  # cosine similarity treated as "same question"
+QUERY_CACHE_DUP_SIMILARITY = 0.99  # above this a new entry replaces the old one
+
+
+class _SemanticQueryCache:
+    """
+    Formatted search_index output keyed by query embedding.
+    
+    A lookup is a cosine-similarity probe over the cached embeddings (a few
+    hundred rows, so a single matmul); entries expire after a TTL, are evicted
+    LRU, and are dropped wholesale when the search engine's contents change.
+    """
+    
+    def __init__(self, maxsize: int = QUERY_CACHE_MAXSIZE, ttl: float = QUERY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation: int | None = None
+        self._vectors: np.ndarray | None = None  # (n, d) unit rows, aligned with _entries
+        self._entries: list[list] = []  # [top_k, formatted, expires_at, last_used]
+    
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = vector.reshape(-1).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _best_match(self, q: np.ndarray, top_k: int) -> tuple[int, float]:
+        """Index and similarity of the closest cached query with the same top_k, or (-1, -1.0)."""
+        if self._vectors is None or not self._entries:
+            return -1, -1.0
+        sims = self._vectors @ q
+        for i in np.argsort(sims)[::-1]:
+            if self._entries[i][0] == top_k:
+                return int(i), float(sims[i])
+        return -1, -1.0
+    
+    def _drop(self, i: int) -> None:
+        del self._entries[i]
+        self._vectors = np.delete(self._vectors, i, axis=0)
+    
+    def get(self, vector: np.ndarray, top_k: int, generation: int) -> Optional[str]:
+        q = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            if generation != self._generation:
+                return None
+            i, sim = self._best_match(q, top_k)
+            if i < 0 or sim < QUERY_CACHE_HIT_SIMILARITY:
+                return None
+            entry = self._entries[i]
+            if entry[2] < now:
+                self._drop(i)
+                return None
+            entry[3] = now
+            return entry[1]
+    
+    def put(self, vector: np.ndarray, top_k: int, generation: int, formatted: str) -> None:
+        q = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            if generation != self._generation:
+                self._generation = generation
+                self._vectors = None
+                self._entries = []
+            
+            entry = [top_k, formatted, now + self.ttl, now]
+            i, sim = self._best_match(q, top_k)
+            if i >= 0 and sim >= QUERY_CACHE_DUP_SIMILARITY:
+                self._entries[i] = entry
+                self._vectors[i] = q
+                return
+            
+            if len(self._entries) >= self.maxsize:
+                self._drop(min(range(len(self._entries)), key=lambda j: self._entries[j][3]))
+            
+            self._entries.append(entry)
+            self._vectors = q[None, :] if self._vectors is None else np.vstack([self._vectors, q])
+
+
+_query_cache = _SemanticQueryCache()
+
+
+# Result labels are module constants and are concatenated, not re-formatted per result
+_L_FILE = "📁 File: "
+
+# Optional per-result lines: (doc key, label, list separator or None for text, max items)
+_RESULT_SECTIONS = (
+    ("purpose", "🎯 Purpose: ", None, None),
+    ("summary", "📝 Summary: ", None, None),
+    ("functions", "⚙️ Functions: ", ", ", 10),
+    ("classes", "🏗️ Classes: ", ", ", 10),
+    ("dependencies", "🔗 Dependencies: ", ", ", 5),
+    ("notes", "📌 Notes: ", "; ", 3),
+)
+
+
+@lru_cache(maxsize=1024)
+def _parse_doc(doc_content: str) -> Dict[str, Any]:
+    """
+    Parse a stored document (JSON string), memoized by the raw string so the
+    same chunk hit by several queries is decoded once. Treat the result as read-only.
+    """
+    try:
+        return orjson.loads(doc_content)
+    except orjson.JSONDecodeError as e:
+        ai_logger.warning(f"[TOOL:search_index] Failed to parse doc content as JSON: {str(e)}")
+        return {"content": doc_content}
+
+
+def _format_result(i: int, result: Dict[str, Any], doc: Dict[str, Any]) -> str:
+    """Render a single search hit from its result entry and parsed document."""
+    score = result.get("score", 0)
+    doc_id = result.get("id", "unknown")
+    
+    ai_logger.debug(f"[TOOL:search_index] Result {i}: score={score:.3f}, doc_id={doc_id}")
+    
+    lines = [
+        f"━━━ Result {i} (relevance: {score:.2f}) ━━━",
+        _L_FILE + str(doc.get("file", doc_id)),
+    ]
+    lines.extend(
+        # LLM-written JSON may hold any type here; str() matches the f-string this replaced
+        label + (str(value) if sep is None else sep.join(islice(value, limit)))
+        for key, label, sep, limit in _RESULT_SECTIONS
+        if (value := doc.get(key))
+    )
+    return "\n".join(lines)
+
+
+def _format_results(results: List[Dict[str, Any]]) -> str:
+    """Render one query's search hits as the agent-facing text block."""
+    header = f"Found {len(results)} relevant results:\n"
+    # The engine stores documents as JSON strings (upload_document takes str), so
+    # parse them all up front rather than type-checking inside the formatting loop
+    docs = [_parse_doc(r.get("document", "{}")) for r in results]
+    # Each result block ends with a newline; blocks are separated by an empty line
+    return "\n".join([header] + [_format_result(i, r, d) + "\n" for i, (r, d) in enumerate(zip(results, docs), 1)])
+
+
+def _search_formatted(queries: List[str], top_k: int) -> List[str]:
+    """
+    Formatted search output for each query, in order.
+    
+    Embeds all queries, serves semantic-cache hits, and runs every miss
+    through a single FAISS search call.
+    """
+    engine = _engine()
+    engine.ensure_loaded()
+    
+    # Check if index has documents
+    doc_count = len(engine)
+    ai_logger.debug(f"[TOOL:search_index] Index contains {doc_count} documents")
+    
+    if doc_count == 0:
+        ai_logger.warning("[TOOL:search_index] Index is empty, no documents indexed")
+        return ["No documents have been indexed yet. Please analyze a repository first."] * len(queries)
+    
+    generation = engine.generation
+    query_vecs = engine.embed_queries(queries)
+    
+    formatted: List[Optional[str]] = [_query_cache.get(vec, top_k, generation) for vec in query_vecs]
+    misses = [i for i, text in enumerate(formatted) if text is None]
+    ai_logger.debug(f"[TOOL:search_index] Semantic cache hits: {len(queries) - len(misses)}/{len(queries)}")
+    
+    if misses:
+        ai_logger.debug(f"[TOOL:search_index] Executing search...")
+        batch = engine.search_by_vectors(query_vecs[misses], top_k=top_k)
+        
+        for i, results in zip(misses, batch):
+            if not results:
+                ai_logger.debug(f"[TOOL:search_index] No relevant results found for query")
+                formatted[i] = "No relevant context found in the indexed repository for this query."
+                continue
+            
+            ai_logger.debug(f"[TOOL:search_index] Found {len(results)} results")
+            formatted[i] = _format_results(results)
+            _query_cache.put(query_vecs[i], top_k, generation, formatted[i])
+    
+    return formatted
+
 
 def search_index(query: str, top_k: int = 5) -> str:
     """
@@ -72,129 +327,254 @@ def search_index(query: str, top_k: int = 5) -> str:
     ai_logger.debug(f"[TOOL:search_index] Called with query='{query[:80]}...', top_k={top_k}")
     
     try:
-        # Check if index has documents
-        doc_count = len(gemini_search_engine)
-        ai_logger.debug(f"[TOOL:search_index] Index contains {doc_count} documents")
-        
-        if doc_count == 0:
-            ai_logger.warning("[TOOL:search_index] Index is empty, no documents indexed")
-            return "No documents have been indexed yet. Please analyze a repository first."
-        
-        ai_logger.debug(f"[TOOL:search_index] Executing search...")
-        results = gemini_search_engine.search(query_text=query, top_k=top_k)
-        
-        if not results:
-            ai_logger.debug(f"[TOOL:search_index] No relevant results found for query")
-            return "No relevant context found in the indexed repository for this query."
-        
-        ai_logger.debug(f"[TOOL:search_index] Found {len(results)} results")
-        
-        # Format results for the agent
-        formatted_parts = []
-        formatted_parts.append(f"Found {len(results)} relevant results:\n")
-        
-        for i, result in enumerate(results, 1):
-            score = result.get("score", 0)
-            doc_id = result.get("id", "unknown")
-            doc_content = result.get("document", "{}")
-            
-            ai_logger.debug(f"[TOOL:search_index] Result {i}: score={score:.3f}, doc_id={doc_id}")
-            
-            # Parse the document content (it's stored as JSON string)
-            try:
-                if isinstance(doc_content, str):
-                    doc = json.loads(doc_content)
-                else:
-                    doc = doc_content
-            except json.JSONDecodeError as e:
-                ai_logger.warning(f"[TOOL:search_index] Failed to parse doc content as JSON: {str(e)}")
-                doc = {"content": doc_content}
-            
-            file_path = doc.get("file", doc_id)
-            summary = doc.get("summary", "")
-            purpose = doc.get("purpose", "")
-            functions = doc.get("functions", [])
-            classes = doc.get("classes", [])
-            notes = doc.get("notes", [])
-            dependencies = doc.get("dependencies", [])
-            
-            formatted_parts.append(f"━━━ Result {i} (relevance: {score:.2f}) ━━━")
-            formatted_parts.append(f"📁 File: {file_path}")
-            
-            if purpose:
-                formatted_parts.append(f"🎯 Purpose: {purpose}")
-            if summary:
-                formatted_parts.append(f"📝 Summary: {summary}")
-            if functions:
-                formatted_parts.append(f"⚙️ Functions: {', '.join(functions[:10])}")
-            if classes:
-                formatted_parts.append(f"🏗️ Classes: {', '.join(classes[:10])}")
-            if dependencies:
-                formatted_parts.append(f"🔗 Dependencies: {', '.join(dependencies[:5])}")
-            if notes:
-                formatted_parts.append(f"📌 Notes: {'; '.join(notes[:3])}")
-            
-            formatted_parts.append("")  # Empty line between results
-        
-        ai_logger.debug(f"[TOOL:search_index] Returning formatted results")
-        return "\n".join(formatted_parts)
+        return _search_formatted([query], top_k)[0]
         
     except Exception as e:
         ai_logger.error(f"[TOOL:search_index] Error during search: {str(e)}", exc_info=True)
         return f"Error searching index: {str(e)}"
 
 
-def retrieve_code_file(file_path: str, user_id: str = "918262") -> str:
+def search_index_batch(queries: List[str], top_k: int = 5) -> str:
     """
-    Retrieve the complete contents of a file from the repository.
+    Search the indexed repository for several related queries at once.
     
-    Use this tool when you need to see the full content of a specific file
-    that was mentioned in search results or by the user.
+    Prefer this over repeated search_index calls when you need context for
+    multiple topics in the same step; all queries are answered together.
     
     Args:
-        file_path: The path to the file to retrieve (relative or absolute)
-        user_id: User ID for locating stored repositories
+        queries: The search queries, each as specific as for search_index.
+        top_k: Number of results to return per query (default: 5)
         
     Returns:
-        The complete file contents, or an error message if not found.
+        One formatted section per query, in the order given.
     """
-    ai_logger.debug(f"[TOOL:retrieve_code_file] Called with file_path='{file_path}', user_id='{user_id}'")
+    ai_logger.debug(f"[TOOL:search_index_batch] Called with {len(queries)} queries, top_k={top_k}")
+    
+    queries = [q for q in queries if q and q.strip()]
+    if not queries:
+        return "No search queries provided."
     
     try:
-        path = Path(file_path)
+        sections = _search_formatted(queries, top_k)
+        return "\n\n".join(
+            f"### Query {n}: {query}\n{section}"
+            for n, (query, section) in enumerate(zip(queries, sections), 1)
+        )
         
-        # Try direct path first
-        if path.exists() and path.is_file():
-            ai_logger.debug(f"[TOOL:retrieve_code_file] Found file at direct path: {path}")
-            max_size = 100_000  # 100KB limit
-            file_size = path.stat().st_size
-            
-            if file_size > max_size:
-                ai_logger.warning(f"[TOOL:retrieve_code_file] File too large: {file_size} bytes (max: {max_size})")
-                return f"File too large ({file_size} bytes). Maximum: {max_size} bytes."
-            
-            ai_logger.debug(f"[TOOL:retrieve_code_file] Reading file ({file_size} bytes)...")
-            content = path.read_text(encoding="utf-8", errors="replace")
-            ai_logger.debug(f"[TOOL:retrieve_code_file] Successfully read {len(content)} characters")
-            return f"━━━ {file_path} ━━━\n{content}"
-        
-        # Try searching in repo storage
-        ai_logger.debug(f"[TOOL:retrieve_code_file] File not found at direct path, searching in repo storage...")
-        repo_storage = Path(REPO_STORAGE) / str(user_id)
-        
-        if repo_storage.exists():
-            ai_logger.debug(f"[TOOL:retrieve_code_file] Searching in user storage: {repo_storage}")
-            # Search for the file
-            for repo_dir in repo_storage.iterdir():
-                if repo_dir.is_dir() and repo_dir.name not in ["chunks", "indexed_file", "llm_response"]:
-                    potential_path = repo_dir / file_path
-                    if potential_path.exists():
-                        ai_logger.debug(f"[TOOL:retrieve_code_file] Found file at: {potential_path}")
-                        content = potential_path.read_text(encoding="utf-8", errors="replace")
-                        ai_logger.debug(f"[TOOL:retrieve_code_file] Successfully read {len(content)} characters")
-                        return f"━━━ {file_path} ━━━\n{content}"
-        else:
-            ai_logger.debug(f"[TOOL:retrieve_code_file] Repo storage not found at: {repo_storage}")
+    except Exception as e:
+        ai_logger.error(f"[TOOL:search_index_batch] Error during search: {str(e)}", exc_info=True)
+        return f"Error searching index: {str(e)}"
+
+
+# user_id -> (user storage mtime_ns, {repo-relative path: absolute path})
+_file_index_cache: Dict[str, tuple[int, Dict[str, str]]] = {}
+
+
+def _user_file_index(user_id: str, repo_storage: Path) -> Dict[str, str]:
+    """
+    Map repo-relative file paths to absolute paths across a user's stored repos.
+    
+    Rebuilt when the user's storage dir mtime changes (a repo is cloned or
+    removed). When two repos share a path, the first one scanned wins, as in
+    the linear lookup it replaces.
+    """
+    mtime = repo_storage.stat().st_mtime_ns
+    cached = _file_index_cache.get(user_id)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    
+    index: Dict[str, str] = {}
+    for repo_dir in _iter_repo_dirs(repo_storage):
+        for abs_path, rel_path in _walk(repo_dir, _INDEX_IGNORE_DIRS):
+            index.setdefault(rel_path, abs_path)
+    
+    _file_index_cache[user_id] = (mtime, index)
+    ai_logger.debug(f"[TOOL:retrieve_code_file] Indexed {len(index)} files for user {user_id}")
+    return index
+
+
+def _find_in_storage(user_id: str, repo_storage: Path, file_path: str) -> Optional[Path]:
+    """
+    Locate a repo-relative file across a user's stored repos: cached path
+    index first, then a per-repo probe for paths the index can't know about
+    (hidden/ignored dirs, or files created since it was built).
+    """
+    indexed_path = _user_file_index(user_id, repo_storage).get(posixpath.normpath(file_path.replace("\\", "/")))
+    if indexed_path is not None and os.path.isfile(indexed_path):
+        return Path(indexed_path)
+    
+    for repo_dir in _iter_repo_dirs(repo_storage):
+        potential_path = os.path.join(repo_dir, file_path)
+        if os.path.isfile(potential_path):
+            return Path(potential_path)
+    return None
+
+
+def _resolve_file(user_id: str, file_path: str) -> Optional[Path]:
+    """
+    Shared lookup for the file tools: the path as given if it is a file inside
+    the user's storage, otherwise the first match in the user's stored repos
+    (None if neither). Any result must lie inside the user's own storage.
+    """
+    repo_storage = Path(REPO_STORAGE) / user_id
+    if not os.path.isdir(repo_storage):
+        ai_logger.debug(f"[TOOL] Repo storage not found at: {repo_storage}")
+        return None
+    
+    # Paths come from the model: no escaping to other users' trees or the host filesystem
+    storage_root = os.path.realpath(repo_storage) + os.sep
+    
+    # A relative path may also exist under the server's CWD (e.g. requirements.txt);
+    # that copy is skipped so the lookup still reaches the user's repos
+    if os.path.isfile(file_path) and os.path.realpath(file_path).startswith(storage_root):
+        return Path(file_path)
+    
+    found = _find_in_storage(user_id, repo_storage, file_path)
+    if found is None:
+        return None
+    
+    if not os.path.realpath(found).startswith(storage_root):
+        ai_logger.warning(f"[TOOL] Rejected path outside user storage: {file_path}")
+        return None
+    return found
+
+
+RETRIEVE_MAX_BYTES = 100_000  # 100KB limit
+_READ_CHUNK = 64 * 1024
+# Below this, mmap setup costs more than it saves
+MMAP_MIN_BYTES = 32 * 1024
+
+
+def _read_capped(path: Path, max_size: int) -> tuple[bytes, int]:
+    """
+    Read at most max_size + 1 bytes with raw os.read calls.
+    Returns (data, file_size); data is empty when the file is over the limit.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        chunks = []
+        remaining = max_size + 1
+        while remaining > 0:
+            chunk = os.read(fd, min(remaining, _READ_CHUNK))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        if remaining <= 0:
+            return b"", os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    data = b"".join(chunks)
+    return data, len(data)
+
+
+def _decode_text(raw: bytes) -> str:
+    """Decode like Path.read_text(errors="replace"), including universal-newline translation."""
+    text = raw.decode("utf-8", "replace")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _find_search_block(path: Path, search_block: str) -> tuple[str, int]:
+    """
+    Return (file text, offset of search_block in it), offset -1 on a miss,
+    scanning the file for the block once.
+    
+    Files of at least MMAP_MIN_BYTES are searched on their memory-mapped bytes:
+    a miss returns ("", -1) without decoding, and a hit decodes around the match
+    so its offset needs no second search. Whatever the bytes can't decide
+    (carriage returns, invalid UTF-8) falls back to decoding and str.find.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size >= MMAP_MIN_BYTES:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                hit = mm.find(search_block.encode("utf-8"))
+                if hit == -1:
+                    # Decoding rewrites \r and invalid bytes; without either, a bytes miss means a text miss
+                    if mm.find(b"\r") == -1 and "\ufffd" not in search_block:
+                        return "", -1
+                else:
+                    try:
+                        head, tail = mm[:hit].decode("utf-8"), mm[hit:].decode("utf-8")
+                    except UnicodeDecodeError:
+                        pass
+                    else:
+                        if "\r" not in head and "\r" not in tail:
+                            return head + tail, len(head)
+    text = _read_text_fast(path)
+    return text, text.find(search_block)
+
+
+def _read_text_fast(path: Path) -> str:
+    """Whole file as text via unbuffered os.read calls sized from fstat, decoded once."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        chunks = []
+        # +1 so a file that grew since fstat still ends on an empty read
+        size = os.fstat(fd).st_size + 1
+        while chunk := os.read(fd, size):
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+    return _decode_text(b"".join(chunks))
+
+
+def _read_window(path: Path, start_line: int, max_lines: int) -> tuple[bytes, int, int]:
+    """
+    Bytes of lines [start_line, start_line + max_lines), never more than
+    RETRIEVE_MAX_BYTES. Returns (data, number of lines read, lines scanned);
+    lines scanned equals the file's line count when the window starts past EOF.
+    """
+    lines = []
+    budget = RETRIEVE_MAX_BYTES
+    scanned = 0
+    with open(path, "rb") as f:
+        for lineno, line in enumerate(f):
+            scanned = lineno + 1
+            if lineno < start_line:
+                continue
+            if len(lines) >= max_lines or len(line) > budget:
+                break
+            lines.append(line)
+            budget -= len(line)
+    return b"".join(lines), len(lines), scanned
+
+
+def _format_file(path: Path, file_path: str, start_line: int = 0, max_lines: int = 0) -> str:
+    """
+    Tool output for a file: header line plus decoded contents, or a size-limit message.
+    A window (start_line/max_lines) is read line by line and is not subject to the whole-file cap.
+    """
+    if start_line > 0 or max_lines > 0:
+        start_line = max(start_line, 0)
+        raw, count, scanned = _read_window(path, start_line, max_lines if max_lines > 0 else RETRIEVE_MAX_BYTES)
+        ai_logger.debug(f"[TOOL:retrieve_code_file] Read {count} lines from line {start_line}")
+        if count == 0:
+            if scanned <= start_line:
+                return f"start_line {start_line} is beyond end of file ({scanned} lines)."
+            return f"Line {start_line + 1} is too large ({RETRIEVE_MAX_BYTES} bytes maximum)."
+        return "".join((f"━━━ {file_path} (lines {start_line + 1}-{start_line + count}) ━━━\n", _decode_text(raw)))
+    
+    raw, file_size = _read_capped(path, RETRIEVE_MAX_BYTES)
+    if not raw and file_size > RETRIEVE_MAX_BYTES:
+        ai_logger.warning(f"[TOOL:retrieve_code_file] File too large: {file_size} bytes (max: {RETRIEVE_MAX_BYTES})")
+        return f"File too large ({file_size} bytes). Maximum: {RETRIEVE_MAX_BYTES} bytes."
+    
+    ai_logger.debug(f"[TOOL:retrieve_code_file] Successfully read {file_size} bytes")
+    return "".join(("━━━ ", file_path, " ━━━\n", _decode_text(raw)))
+
+
+def _retrieve_code_file(file_path: str, user_id: str, start_line: int = 0, max_lines: int = 0) -> str:
+    """Blocking body of retrieve_code_file; runs in a worker thread."""
+    ai_logger.debug(f"[TOOL:retrieve_code_file] Called with file_path='{file_path}', user_id='{user_id}'")
+    
+    try:
+        # Direct path first, then the user's stored repos
+        found = _resolve_file(str(user_id), file_path)
+        if found is not None:
+            ai_logger.debug(f"[TOOL:retrieve_code_file] Found file at: {found}")
+            return _format_file(found, file_path, start_line, max_lines)
         
         ai_logger.warning(f"[TOOL:retrieve_code_file] File not found: {file_path}")
         return f"File not found: {file_path}. Please check the path and try again."
@@ -204,7 +584,93 @@ def retrieve_code_file(file_path: str, user_id: str = "918262") -> str:
         return f"Error retrieving file: {str(e)}"
 
 
-def get_indexed_files(folder_id: str = None, user_id: str = "918262") -> str:
+async def retrieve_code_file(file_path: str, start_line: int = 0, max_lines: int = 0) -> str:
+    """
+    Retrieve the contents of a file from the repository.
+    
+    Use this tool when you need to see the full content of a specific file
+    that was mentioned in search results or by the user. For large files,
+    pass start_line/max_lines to read just the region you need.
+    
+    Args:
+        file_path: The path to the file to retrieve (relative or absolute)
+        start_line: 0-based line to start reading from (default: start of file)
+        max_lines: Maximum number of lines to return (default 0: the whole file)
+        
+    Returns:
+        The file contents (or the requested line window), or an error message if not found.
+    """
+    # Lookup and read are all syscalls; keep them off the event loop
+    # The user is always the requesting one, never a model-supplied argument
+    return await asyncio.to_thread(_retrieve_code_file, file_path, get_current_user_id(), start_line, max_lines)
+
+
+RESPONSE_READ_WORKERS = 8
+
+
+# response file path -> (mtime_ns, size, files_index); only files_index is ever read
+_response_cache: Dict[str, tuple[int, int, dict]] = {}
+
+
+def _read_response_file(response_file: Path):
+    """
+    Return a response file's files_index (or the exception raised reading it).
+    Parses are memoized on (mtime_ns, size), so unchanged files cost one stat.
+    """
+    try:
+        st = os.stat(response_file)
+        key = str(response_file)
+        cached = _response_cache.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        
+        files_index = orjson.loads(response_file.read_bytes()).get("files_index", {})
+        _response_cache[key] = (st.st_mtime_ns, st.st_size, files_index)
+        return files_index
+    except Exception as e:
+        return e
+
+
+def _list_indexed_repos(llm_response_dir: Path) -> List[str]:
+    """Format the repositories and files recorded in a user's llm_response directory."""
+    result: List[str] = []
+    # Plain name checks on scandir entries; no per-entry Path or fnmatch as with glob
+    with os.scandir(llm_response_dir) as entries:
+        response_files = [
+            Path(entry.path) for entry in sorted(entries, key=lambda e: e.name)
+            if entry.name.startswith("response_") and entry.name.endswith(".json")
+        ]
+    ai_logger.debug(f"[TOOL:get_indexed_files] Found {len(response_files)} response files")
+    
+    # Files are independent, so reads/parses overlap; formatting stays in order below
+    with ThreadPoolExecutor(max_workers=min(RESPONSE_READ_WORKERS, len(response_files) or 1)) as executor:
+        parsed = list(executor.map(_read_response_file, response_files))
+    
+    for response_file, files_index in zip(response_files, parsed):
+        try:
+            if isinstance(files_index, Exception):
+                raise files_index
+            folder = response_file.stem.replace("response_", "")
+            
+            ai_logger.debug(f"[TOOL:get_indexed_files] Repository '{folder}': {len(files_index)} files")
+            
+            result.append(f"\n📁 Repository: {folder}")
+            result.append(f"   Files indexed: {len(files_index)}")
+            
+            for file_path in islice(files_index, 10):
+                result.append(f"   - {file_path}")
+            
+            if len(files_index) > 10:
+                result.append(f"   ... and {len(files_index) - 10} more files")
+                
+        except Exception as e:
+            ai_logger.warning(f"[TOOL:get_indexed_files] Failed to parse response file {response_file}: {str(e)}")
+            continue
+    
+    return result
+
+
+def get_indexed_files(folder_id: str = None) -> str:
     """
     List all files that have been indexed for a repository.
     
@@ -213,16 +679,19 @@ def get_indexed_files(folder_id: str = None, user_id: str = "918262") -> str:
     
     Args:
         folder_id: Optional folder ID to filter by
-        user_id: User ID for locating stored data
         
     Returns:
         A list of indexed files with their basic information.
     """
+    user_id = get_current_user_id()
     ai_logger.debug(f"[TOOL:get_indexed_files] Called with folder_id='{folder_id}', user_id='{user_id}'")
     
     try:
+        engine = _engine()
+        engine.ensure_loaded()
+        
         # Get stats from the search engine
-        stats = gemini_search_engine.get_stats()
+        stats = engine.get_stats()
         ai_logger.debug(f"[TOOL:get_indexed_files] Index stats: {stats}")
         
         result = [
@@ -237,30 +706,9 @@ def get_indexed_files(folder_id: str = None, user_id: str = "918262") -> str:
         llm_response_dir = Path(REPO_STORAGE) / str(user_id) / "llm_response"
         ai_logger.debug(f"[TOOL:get_indexed_files] Checking for LLM responses at: {llm_response_dir}")
         
-        if llm_response_dir.exists():
-            response_files = list(llm_response_dir.glob("response_*.json"))
-            ai_logger.debug(f"[TOOL:get_indexed_files] Found {len(response_files)} response files")
-            
-            for response_file in response_files:
-                try:
-                    data = json.loads(response_file.read_text(encoding="utf-8"))
-                    folder = response_file.stem.replace("response_", "")
-                    files_index = data.get("files_index", {})
-                    
-                    ai_logger.debug(f"[TOOL:get_indexed_files] Repository '{folder}': {len(files_index)} files")
-                    
-                    result.append(f"\n📁 Repository: {folder}")
-                    result.append(f"   Files indexed: {len(files_index)}")
-                    
-                    for file_path in list(files_index.keys())[:10]:
-                        result.append(f"   - {file_path}")
-                    
-                    if len(files_index) > 10:
-                        result.append(f"   ... and {len(files_index) - 10} more files")
-                        
-                except Exception as e:
-                    ai_logger.warning(f"[TOOL:get_indexed_files] Failed to parse response file {response_file}: {str(e)}")
-                    continue
+        # Unchanged response files are served from _response_cache after one stat each
+        if llm_response_dir.is_dir():
+            result.extend(_list_indexed_repos(llm_response_dir))
         else:
             ai_logger.debug(f"[TOOL:get_indexed_files] LLM response directory not found")
         
@@ -274,68 +722,64 @@ def get_indexed_files(folder_id: str = None, user_id: str = "918262") -> str:
 
 # --- Code Proposal Tool (for Diff Viewer) ---
 
-# In-memory storage for pending proposals (session_id -> proposal)
-_pending_proposals: Dict[str, Dict[str, Any]] = {}
+# In-memory storage for pending proposals (proposal_id -> (expires_at, proposal)).
+# Bounded: abandoned proposals expire, and the oldest are dropped past PROPOSAL_MAXSIZE.
+PROPOSAL_MAXSIZE = 256
+PROPOSAL_TTL = 3600  # seconds
+_pending_proposals: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+# user_id -> proposal ids, kept in step with _pending_proposals for user-scoped operations
+_user_proposals: Dict[str, set[str]] = {}
+_pending_proposals_lock = threading.Lock()
+
+
+def _drop_proposal_locked(proposal_id: str) -> bool:
+    """Remove a proposal and its reverse-map entry. Caller holds _pending_proposals_lock."""
+    entry = _pending_proposals.pop(proposal_id, None)
+    if entry is None:
+        return False
+    user_id = entry[1]["user_id"]
+    ids = _user_proposals.get(user_id)
+    if ids is not None:
+        ids.discard(proposal_id)
+        if not ids:
+            del _user_proposals[user_id]
+    return True
+
 
+def _store_proposal(proposal_id: str, user_id: str, proposal: Dict[str, Any]) -> None:
+    now = time.monotonic()
+    proposal["user_id"] = user_id
+    with _pending_proposals_lock:
+        while _pending_proposals:
+            oldest_id, (expires_at, _) = next(iter(_pending_proposals.items()))
+            if expires_at > now and len(_pending_proposals) < PROPOSAL_MAXSIZE:
+                break
+            _drop_proposal_locked(oldest_id)
+        _pending_proposals[proposal_id] = (now + PROPOSAL_TTL, proposal)
+        _user_proposals.setdefault(user_id, set()).add(proposal_id)
 
-def propose_code_change(
+
+def _splice(content: str, offset: int, search_block: str, replacement_block: str) -> str:
+    """Replace the search_block found at `offset` without rescanning the content."""
+    return content[:offset] + replacement_block + content[offset + len(search_block):]
+
+
+def _propose_code_change(
     file_path: str, 
     search_block: str, 
     replacement_block: str,
-    user_id: str = "918262"
+    user_id: str
 ) -> Dict[str, Any]:
-    """
-    Propose a code change without writing to disk.
-    
-    Use this tool when you want to modify a file. Instead of writing directly,
-    this tool creates a proposal that the user can review and accept/reject.
-    
-    The tool finds the `search_block` in the file and replaces it with `replacement_block`.
-    This is token-efficient - you only need to provide the changed portion.
-    
-    Args:
-        file_path: Path to the file to modify (relative or absolute)
-        search_block: The exact code block to find and replace. 
-                      Must match the file content exactly (including whitespace).
-        replacement_block: The new code to replace the search_block with.
-        user_id: User ID for locating stored repositories.
-        
-    Returns:
-        A dict with proposal details (for SSE propagation) including:
-        - file_path: The target file
-        - original_content: Full original file content
-        - proposed_content: Full file content after replacement
-        - success: Whether the search block was found
-    """
+    """Blocking body of propose_code_change; runs in a worker thread."""
     ai_logger.debug(f"[TOOL:propose_code_change] Called for file: {file_path}")
     ai_logger.debug(f"[TOOL:propose_code_change] Search block length: {len(search_block)} chars")
     ai_logger.debug(f"[TOOL:propose_code_change] Replacement block length: {len(replacement_block)} chars")
     
     try:
-        # Find the file (similar logic to retrieve_code_file)
-        path = Path(file_path)
-        original_content = None
-        resolved_path = None
-        
-        # Try direct path first
-        if path.exists() and path.is_file():
-            resolved_path = path
-            original_content = path.read_text(encoding="utf-8", errors="replace")
-            ai_logger.debug(f"[TOOL:propose_code_change] Found file at direct path: {path}")
-        else:
-            # Search in repo storage
-            repo_storage = Path(REPO_STORAGE) / str(user_id)
-            if repo_storage.exists():
-                for repo_dir in repo_storage.iterdir():
-                    if repo_dir.is_dir() and repo_dir.name not in ["chunks", "indexed_file", "llm_response"]:
-                        potential_path = repo_dir / file_path
-                        if potential_path.exists():
-                            resolved_path = potential_path
-                            original_content = potential_path.read_text(encoding="utf-8", errors="replace")
-                            ai_logger.debug(f"[TOOL:propose_code_change] Found file at: {potential_path}")
-                            break
+        # Find the file (same lookup as retrieve_code_file)
+        resolved_path = _resolve_file(str(user_id), file_path)
         
-        if original_content is None:
+        if resolved_path is None:
             ai_logger.warning(f"[TOOL:propose_code_change] File not found: {file_path}")
             return {
                 "success": False,
@@ -343,8 +787,11 @@ def propose_code_change(
                 "file_path": file_path
             }
         
-        # Check if search_block exists in the file
-        if search_block not in original_content:
+        ai_logger.debug(f"[TOOL:propose_code_change] Found file at: {resolved_path}")
+        
+        # One scan locates the block; the same offset drives the splice below
+        original_content, offset = _find_search_block(resolved_path, search_block)
+        if offset == -1:
             ai_logger.warning(f"[TOOL:propose_code_change] Search block not found in file")
             return {
                 "success": False,
@@ -353,18 +800,19 @@ def propose_code_change(
             }
         
         # Apply the replacement (in memory only!)
-        proposed_content = original_content.replace(search_block, replacement_block, 1)
+        proposed_content = _splice(original_content, offset, search_block, replacement_block)
         ai_logger.debug(f"[TOOL:propose_code_change] Replacement applied in memory")
         
         # Store proposal for potential acceptance later
-        proposal_id = f"{user_id}_{uuid.uuid4().hex}"
-        _pending_proposals[proposal_id] = {
+        proposal_id = f"{user_id}_{secrets.token_hex(16)}"  # 128 random bits, like uuid4
+        # proposed_content is rebuilt on demand, so only one copy of the file is held
+        _store_proposal(proposal_id, str(user_id), {
             "file_path": str(resolved_path),
             "original_content": original_content,
-            "proposed_content": proposed_content,
             "search_block": search_block,
-            "replacement_block": replacement_block
-        }
+            "replacement_block": replacement_block,
+            "offset": offset
+        })
         ai_logger.debug(f"[TOOL:propose_code_change] Stored proposal with ID: {proposal_id}")
         
         # Return structured data (this will be captured by EventCapture and sent to frontend)
@@ -386,15 +834,67 @@ def propose_code_change(
         }
 
 
+async def propose_code_change(
+    file_path: str, 
+    search_block: str, 
+    replacement_block: str
+) -> Dict[str, Any]:
+    """
+    Propose a code change without writing to disk.
+    
+    Use this tool when you want to modify a file. Instead of writing directly,
+    this tool creates a proposal that the user can review and accept/reject.
+    
+    The tool finds the `search_block` in the file and replaces it with `replacement_block`.
+    This is token-efficient - you only need to provide the changed portion.
+    
+    Args:
+        file_path: Path to the file to modify (relative or absolute)
+        search_block: The exact code block to find and replace. 
+                      Must match the file content exactly (including whitespace).
+        replacement_block: The new code to replace the search_block with.
+        
+    Returns:
+        A dict with proposal details (for SSE propagation) including:
+        - file_path: The target file
+        - original_content: Full original file content
+        - proposed_content: Full file content after replacement
+        - success: Whether the search block was found
+    """
+    return await asyncio.to_thread(_propose_code_change, file_path, search_block, replacement_block, get_current_user_id())
+
+
 def get_pending_proposal(proposal_id: str) -> Optional[Dict[str, Any]]:
-    """Get a pending proposal by ID (for acceptance/rejection)."""
-    return _pending_proposals.get(proposal_id)
+    """Get a pending proposal by ID (for acceptance/rejection), or None if unknown or expired."""
+    with _pending_proposals_lock:
+        entry = _pending_proposals.get(proposal_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            _drop_proposal_locked(proposal_id)
+            return None
+        proposal = entry[1]
+    
+    return {
+        **proposal,
+        "proposed_content": _splice(
+            proposal["original_content"], proposal["offset"],
+            proposal["search_block"], proposal["replacement_block"]
+        ),
+    }
 
 
 def clear_proposal(proposal_id: str) -> bool:
     """Clear a proposal after acceptance or rejection."""
-    if proposal_id in _pending_proposals:
-        del _pending_proposals[proposal_id]
-        return True
-    return False
+    with _pending_proposals_lock:
+        return _drop_proposal_locked(proposal_id)
+
+
+def clear_user_proposals(user_id: str) -> int:
+    """Clear every pending proposal for a user. Returns how many were removed."""
+    with _pending_proposals_lock:
+        ids = _user_proposals.pop(user_id, set())
+        for proposal_id in ids:
+            _pending_proposals.pop(proposal_id, None)
+    return len(ids)
 
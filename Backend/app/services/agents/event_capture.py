@@ -11,9 +11,11 @@ Captures and structures all events from the multi-agent system including:
 This provides full visibility into the agent's decision-making process.
 """
 
+import re
+import time
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass, field
-from datetime import datetime
 from enum import Enum
 
 from app.utils.logget_setup import ai_logger
@@ -36,10 +38,25 @@ class EventType(str, Enum):
     CODE_PROPOSAL = "code_proposal"  # For Diff Viewer integration
 
 
+# Plain-string event names for the SSE hot path (skips the enum .value lookup per emit)
+_EVT_TOOL_CALL = EventType.TOOL_CALL.value
+_EVT_TOOL_RESPONSE = EventType.TOOL_RESPONSE.value
+_EVT_SUB_AGENT_CALL = EventType.SUB_AGENT_CALL.value
+_EVT_SUB_AGENT_RESPONSE = EventType.SUB_AGENT_RESPONSE.value
+_EVT_FINAL = EventType.FINAL_RESPONSE.value
+_EVT_THINK = EventType.AGENT_THINKING.value
+_EVT_ERROR = EventType.ERROR.value
+_EVT_STATE = EventType.STATE_CHANGE.value
+_EVT_CITATION = EventType.CITATION.value
+_EVT_TOKEN = EventType.TOKEN_USAGE.value
+_EVT_CODE = EventType.CODE_PROPOSAL.value
+
+
 # User-friendly aliases for tools and agents
 TOOL_ALIASES = {
     "get_indexed_files": "Checking repository structure",
     "search_index": "Searching codebase",
+    "search_index_batch": "Searching codebase",
     "retrieve_code_file": "Reading file contents",
     "list_directory": "Browsing directory",
     "get_file_content": "Loading file",
@@ -57,90 +74,132 @@ AGENT_ALIASES = {
 
 ERROR_MESSAGE = system_config.get("ERROR_MESSAGE", "An error occured!")
 
+# Tool-response patterns, compiled once for the SSE hot path
+_INDEXED_RE = re.compile(r'Total indexed documents:\s*(\d+)')
+_FOUND_RE = re.compile(r'Found\s+(\d+)\s+relevant')
+_FILE_HDR_RE = re.compile(r'━+\s*([^\s━]+)\s*━+')
+
+# Names come from a small fixed set, so the aliases are memoized (and logged once per name)
+@lru_cache(maxsize=256)
 def get_tool_alias(tool_name: str) -> str:
     """Get user-friendly alias for a tool name."""
     alias = TOOL_ALIASES.get(tool_name, tool_name.replace("_", " ").title())
-    ai_logger.debug(f"[ALIAS] Tool '{tool_name}' -> '{alias}'")
+    ai_logger.debug("[ALIAS] Tool '%s' -> '%s'", tool_name, alias)
     return alias
 
 
+@lru_cache(maxsize=256)
 def get_agent_alias(agent_name: str) -> str:
     """Get user-friendly alias for an agent name."""
     alias = AGENT_ALIASES.get(agent_name, agent_name.replace("_", " ").title())
-    ai_logger.debug(f"[ALIAS] Agent '{agent_name}' -> '{alias}'")
+    ai_logger.debug("[ALIAS] Agent '%s' -> '%s'", agent_name, alias)
     return alias
 
 
+def _summarize_indexed(response_str: str) -> str:
+    if "Total indexed documents:" in response_str:
+        match = _INDEXED_RE.search(response_str)
+        if match:
+            return f"Found {match.group(1)} indexed files"
+    return "Checked index"
+
+
+def _summarize_search(response_str: str) -> str:
+    if "Found" in response_str and "relevant" in response_str:
+        match = _FOUND_RE.search(response_str)
+        if match:
+            return f"Found {match.group(1)} relevant results"
+    return "Search complete"
+
+
+def _summarize_file(response_str: str) -> str:
+    match = _FILE_HDR_RE.search(response_str)
+    if match:
+        return f"Loaded {match.group(1)}"
+    return "File loaded"
+
+
+# Exact tool name -> summarizer; anything else falls back to the agent/default text
+_SUMMARIZERS = {
+    "get_indexed_files": _summarize_indexed,
+    "search_index": _summarize_search,
+    "search_index_batch": _summarize_search,
+    "retrieve_code_file": _summarize_file,
+    "get_file_content": _summarize_file,
+}
+
+# Substrings that mark a function call/response as a sub-agent rather than a tool
+_AGENT_TOKENS_RE = re.compile(r'agent|orchestrator|assistant|system|manager', re.I)
+
+
+def _is_agent_name(tool_name: str) -> bool:
+    """Whether a function name refers to a sub-agent (one case-insensitive regex scan)."""
+    return _AGENT_TOKENS_RE.search(tool_name) is not None
+
+
 def summarize_tool_response(tool_name: str, response_str: str) -> str:
     """Generate a user-friendly summary of a tool response."""
-    ai_logger.debug(f"[SUMMARIZE] Summarizing response for tool '{tool_name}' (response_length={len(response_str)})")
+    ai_logger.debug("[SUMMARIZE] Summarizing response for tool '%s' (response_length=%s)", tool_name, len(response_str))
     
     try:
-        # User-friendly aliases for agents if it's an agent calling an agent
-        is_agent = 'agent' in tool_name.lower()
-        
-        # Parse common patterns from responses
-        if "get_indexed_files" in tool_name:
-            if "Total indexed documents:" in response_str:
-                import re
-                match = re.search(r'Total indexed documents:\s*(\d+)', response_str)
-                if match:
-                    summary = f"Found {match.group(1)} indexed files"
-                    ai_logger.debug(f"[SUMMARIZE] Generated summary: '{summary}'")
-                    return summary
-            return "Checked index"
-        
-        elif "search_index" in tool_name:
-            if "Found" in response_str and "relevant" in response_str:
-                import re
-                match = re.search(r'Found\s+(\d+)\s+relevant', response_str)
-                if match:
-                    summary = f"Found {match.group(1)} relevant results"
-                    ai_logger.debug(f"[SUMMARIZE] Generated summary: '{summary}'")
-                    return summary
-            return "Search complete"
-        
-        elif "retrieve_code_file" in tool_name or "get_file_content" in tool_name:
-            import re
-            match = re.search(r'━+\s*([^\s━]+)\s*━+', response_str)
-            if match:
-                summary = f"Loaded {match.group(1)}"
-                ai_logger.debug(f"[SUMMARIZE] Generated summary: '{summary}'")
-                return summary
-            return "File loaded"
+        handler = _SUMMARIZERS.get(tool_name)
+        if handler is not None:
+            summary = handler(response_str)
+            ai_logger.debug("[SUMMARIZE] Generated summary: '%s'", summary)
+            return summary
         
-        elif is_agent:
+        if 'agent' in tool_name.casefold():
             # If it's an agent, try to see if it's actually "complete" or just "ready"
             if len(response_str) > 10:
                 return "Provided findings"
             return "Analysis complete"
         
-        else:
-            return "Analyzing final response..."
+        return "Analyzing final response..."
             
     except Exception as e:
         ai_logger.warning(f"[SUMMARIZE] Failed to summarize tool response: {str(e)}")
         return "Complete"
 
 
-@dataclass
+# (second, "YYYY-MM-DDTHH:MM:SS") for the last second formatted; strftime runs once per second
+_ts_cache: tuple[int, str] = (0, "")
+
+
+def _utc_timestamp() -> str:
+    """UTC ISO-8601 timestamp with microseconds, same shape as datetime.utcnow().isoformat()."""
+    global _ts_cache
+    now = time.time()
+    sec = int(now)
+    cached_sec, prefix = _ts_cache
+    if sec != cached_sec:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+        _ts_cache = (sec, prefix)
+    return f"{prefix}.{int((now - sec) * 1_000_000):06d}"
+
+
+@dataclass(slots=True)
 class AgentEvent:
     """Represents a single event in the agent execution flow."""
     event_type: EventType
     timestamp: str
     agent_name: str
     content: Dict[str, Any]
+    # Serialized form, built on first to_dict() and reused for every later frame
+    _payload: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
     
     def to_dict(self) -> Dict[str, Any]:
-        return {
-            "type": self.event_type.value,
-            "timestamp": self.timestamp,
-            "agent": self.agent_name,
-            "content": self.content
-        }
+        """Event as a plain dict. The same dict is returned on every call; treat it as read-only."""
+        if self._payload is None:
+            self._payload = {
+                "type": self.event_type.value,
+                "timestamp": self.timestamp,
+                "agent": self.agent_name,
+                "content": self.content
+            }
+        return self._payload
 
 
-@dataclass 
+@dataclass(slots=True)
 class ExecutionTrace:
     """
     Complete trace of an agent execution session.
@@ -164,12 +223,12 @@ class ExecutionTrace:
         """Add a new event to the trace."""
         event = AgentEvent(
             event_type=event_type,
-            timestamp=datetime.utcnow().isoformat(),
+            timestamp=_utc_timestamp(),
             agent_name=agent_name,
             content=content
         )
         self.events.append(event)
-        ai_logger.debug(f"[TRACE] {event_type.value}: {agent_name} - {str(content)[:200]}")
+        ai_logger.debug("[TRACE] %s: %s - %.200s", event_type.value, agent_name, content)
     
 class EventCapture:
     """
@@ -182,7 +241,7 @@ class EventCapture:
         # State tracking for deduplication
         self._last_status = ""
         self._last_tool_action = ""  # tool_name + type
-        ai_logger.debug(f"[EventCapture] Initialized for session={trace.session_id}, user={trace.user_id}")
+        ai_logger.debug("[EventCapture] Initialized for session=%s, user=%s", trace.session_id, trace.user_id)
     
     def process_event_for_sse(self, event, current_agent: str = "orchestrator") -> List[Dict[str, Any]]:
         """
@@ -199,43 +258,44 @@ class EventCapture:
             List of SSE event dictionaries
         """
         sse_events = []
-        ai_logger.debug(f"[EventCapture] Processing event from agent='{current_agent}'")
+        ai_logger.debug("[EventCapture] Processing event from agent='%s'", current_agent)
         
         try:
+            # current_agent is fixed for the whole event
+            agent_alias = get_agent_alias(current_agent)
+            
             # Check for function calls (tool invocations)
-            function_calls = event.get_function_calls() if hasattr(event, 'get_function_calls') else None
+            get_calls = getattr(event, 'get_function_calls', None)
+            function_calls = get_calls() if get_calls else None
             if function_calls:
-                ai_logger.debug(f"[EventCapture] Found {len(function_calls)} function call(s)")
+                ai_logger.debug("[EventCapture] Found %s function call(s)", len(function_calls))
                 for call in function_calls:
-                    tool_name = call.name if hasattr(call, 'name') else str(call)
-                    is_agent = 'agent' in tool_name.lower() or any(a in tool_name.lower() for a in ["orchestrator", "assistant", "system", "manager"])
+                    tool_name = getattr(call, 'name', None) or str(call)
+                    tool_name_lc = tool_name.casefold()
+                    is_agent = _is_agent_name(tool_name)
                     
-                    ai_logger.debug(f"[EventCapture] Function call: tool='{tool_name}', is_agent={is_agent}")
+                    ai_logger.debug("[EventCapture] Function call: tool='%s', is_agent=%s", tool_name, is_agent)
                     
                     # Get user-friendly aliases
                     tool_alias = get_agent_alias(tool_name) if is_agent else get_tool_alias(tool_name)
-                    agent_alias = get_agent_alias(current_agent)
                     
                     # Extract arguments for more descriptive status messages
-                    tool_args = {}
-                    if hasattr(call, 'args') and call.args:
-                        try:
-                            tool_args = call.args if isinstance(call.args, dict) else {}
-                            ai_logger.debug(f"[EventCapture] tool_args: {tool_args}")
-                        except:
-                            pass
+                    call_args = getattr(call, 'args', None)
+                    tool_args = call_args if isinstance(call_args, dict) else {}
+                    if tool_args:
+                        ai_logger.debug("[EventCapture] tool_args: %s", tool_args)
                     
                     if is_agent:
                         status_msg = f"{agent_alias} is consulting {tool_alias}..."
                     
-                    elif "microsoft" in tool_name.lower() or "learn" in tool_name.lower():
-                        ai_logger.debug(f"[EventCapture] Function call: tool='{tool_name}', is_agent={is_agent}")
+                    elif "microsoft" in tool_name_lc or "learn" in tool_name_lc:
+                        ai_logger.debug("[EventCapture] Function call: tool='%s', is_agent=%s", tool_name, is_agent)
                         status_msg = f"Fetching data from {tool_alias} MCP server..."
                     
-                    elif "google_search" in tool_name.lower():
-                        ai_logger.debug(f"[EventCapture] Function call: tool='{tool_name}', is_agent={is_agent}")
+                    elif "google_search" in tool_name_lc:
+                        ai_logger.debug("[EventCapture] Function call: tool='%s', is_agent=%s", tool_name, is_agent)
                         search_query = tool_args.get('query', '') or tool_args.get('q', '')
-                        ai_logger.debug(f"[EventCapture] search_query: {search_query}")
+                        ai_logger.debug("[EventCapture] search_query: %s", search_query)
                         if search_query:
                             
                             query_preview = search_query[:60] + "..." if len(search_query) > 60 else search_query
@@ -247,7 +307,7 @@ class EventCapture:
                     
                     # Only send status if it's meaningful and different
                     if status_msg != self._last_status:
-                        ai_logger.debug(f"[EventCapture] Emitting status: '{status_msg}'")
+                        ai_logger.debug("[EventCapture] Emitting status: '%s'", status_msg)
                         sse_events.append({
                             "event": "status",
                             "data": {
@@ -259,10 +319,10 @@ class EventCapture:
                         self._last_status = status_msg
                     
                     # Tool/Sub-agent call event
-                    event_type = EventType.SUB_AGENT_CALL if is_agent else EventType.TOOL_CALL
-                    ai_logger.debug(f"[EventCapture] Emitting {event_type.value} event for '{tool_alias}'")
+                    event_type = _EVT_SUB_AGENT_CALL if is_agent else _EVT_TOOL_CALL
+                    ai_logger.debug("[EventCapture] Emitting %s event for '%s'", event_type, tool_alias)
                     sse_events.append({
-                        "event": event_type.value,
+                        "event": event_type,
                         "data": {
                             "tool_name": tool_alias,
                             "is_agent": is_agent
@@ -270,26 +330,27 @@ class EventCapture:
                     })
             
             # Check for function responses
-            function_responses = event.get_function_responses() if hasattr(event, 'get_function_responses') else None
+            get_responses = getattr(event, 'get_function_responses', None)
+            function_responses = get_responses() if get_responses else None
             if function_responses:
-                ai_logger.debug(f"[EventCapture] Found {len(function_responses)} function response(s)")
+                ai_logger.debug("[EventCapture] Found %s function response(s)", len(function_responses))
                 for response in function_responses:
-                    tool_name = response.name if hasattr(response, 'name') else "unknown"
+                    tool_name = getattr(response, 'name', None) or "unknown"
                     # Keep full response for propose_code_change, truncate for others
-                    full_response = response.response if hasattr(response, 'response') else None
+                    full_response = getattr(response, 'response', None)
                     result = str(full_response)[:1000] if full_response else ""
-                    is_agent = 'agent' in tool_name.lower() or any(a in tool_name.lower() for a in ["orchestrator", "assistant", "system", "manager"])
+                    is_agent = _is_agent_name(tool_name)
                     
-                    ai_logger.debug(f"[EventCapture] Function response: tool='{tool_name}', response_length={len(result)}")
+                    ai_logger.debug("[EventCapture] Function response: tool='%s', response_length=%s", tool_name, len(result))
                     
                     # Get aliases and summarize response
                     tool_alias = get_agent_alias(tool_name) if is_agent else get_tool_alias(tool_name)
                     response_summary = summarize_tool_response(tool_name, result)
                     
-                    event_type = EventType.SUB_AGENT_RESPONSE if is_agent else EventType.TOOL_RESPONSE
-                    ai_logger.debug(f"[EventCapture] Emitting {event_type.value} event: summary='{response_summary}'")
+                    event_type = _EVT_SUB_AGENT_RESPONSE if is_agent else _EVT_TOOL_RESPONSE
+                    ai_logger.debug("[EventCapture] Emitting %s event: summary='%s'", event_type, response_summary)
                     sse_events.append({
-                        "event": event_type.value,
+                        "event": event_type,
                         "data": {
                             "tool_name": tool_alias,
                             "response_summary": response_summary
@@ -304,7 +365,7 @@ class EventCapture:
                             if response_data and response_data.get("success"):
                                 ai_logger.info(f"[EventCapture] Emitting CODE_PROPOSAL for {response_data.get('file_path')}")
                                 sse_events.append({
-                                    "event": EventType.CODE_PROPOSAL.value,
+                                    "event": _EVT_CODE,
                                     "data": {
                                         "file_path": response_data.get("file_path"),
                                         "original_content": response_data.get("original_content"),
@@ -318,8 +379,8 @@ class EventCapture:
                             ai_logger.warning(f"[EventCapture] Failed to process propose_code_change response: {parse_err}")
             
             # Check for usage metadata (token counts)
-            if hasattr(event, 'usage_metadata') and event.usage_metadata:
-                usage = event.usage_metadata
+            usage = getattr(event, 'usage_metadata', None)
+            if usage:
                 # ai_logger.debug(f"[TOKEN_USAGE] {usage}")
                 prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
                 candidates_tokens = getattr(usage, 'candidates_token_count', 0) or 0
@@ -336,7 +397,7 @@ class EventCapture:
                 )
                 
                 sse_events.append({
-                    "event": EventType.TOKEN_USAGE.value,
+                    "event": _EVT_TOKEN,
                     "data": {
                         "prompt_tokens": prompt_tokens,
                         "candidates_tokens": candidates_tokens,
@@ -348,18 +409,18 @@ class EventCapture:
             
             # Check for text content (agent thinking/responses)
             if event.content and event.content.parts:
-                ai_logger.debug(f"[EventCapture] Processing {len(event.content.parts)} content part(s)")
+                ai_logger.debug("[EventCapture] Processing %s content part(s)", len(event.content.parts))
                 for part in event.content.parts:
                     if hasattr(part, 'text') and part.text:
                         text_length = len(part.text)
                         is_final = event.is_final_response()
-                        ai_logger.debug(f"[EventCapture] Text content: length={text_length}, is_final={is_final}")
+                        ai_logger.debug("[EventCapture] Text content: length=%s, is_final=%s", text_length, is_final)
                         
                         if is_final:
                             self._accumulated_text += part.text
-                            ai_logger.debug(f"[EventCapture] Emitting FINAL_RESPONSE (accumulated_length={len(self._accumulated_text)})")
+                            ai_logger.debug("[EventCapture] Emitting FINAL_RESPONSE (accumulated_length=%s)", len(self._accumulated_text))
                             sse_events.append({
-                                "event": EventType.FINAL_RESPONSE.value,
+                                "event": _EVT_FINAL,
                                 "data": {
                                     "text": part.text,
                                     "is_final": True
@@ -367,11 +428,10 @@ class EventCapture:
                             })
                         else:
                             if not function_calls and not function_responses:
-                                agent_alias = get_agent_alias(current_agent)
                                 thought_preview = part.text.strip()
                                 if thought_preview and len(thought_preview) > 10:
                                     status_preview = thought_preview[:60].replace("\n", " ") + "..."
-                                    ai_logger.debug(f"[EventCapture] Agent thinking: '{status_preview}'")
+                                    ai_logger.debug("[EventCapture] Agent thinking: '%s'", status_preview)
                                     sse_events.append({
                                         "event": "status",
                                         "data": {
@@ -381,9 +441,9 @@ class EventCapture:
                                         }
                                     })
                                 
-                                ai_logger.debug(f"[EventCapture] Emitting AGENT_THINKING event")
+                                ai_logger.debug("[EventCapture] Emitting AGENT_THINKING event")
                                 sse_events.append({
-                                    "event": EventType.AGENT_THINKING.value,
+                                    "event": _EVT_THINK,
                                     "data": {
                                         "thought": part.text[:1000] + ("..." if len(part.text) > 1000 else ""),
                                         "agent": current_agent
@@ -391,35 +451,41 @@ class EventCapture:
                                 })
             
             # Handle errors
-            if hasattr(event, 'error_code') and event.error_code:
-                error_msg = event.error_message or f"Agent encountered an error ({event.error_code})"
-                ai_logger.error(f"Agent error detected: {event.error_code} - {error_msg}")
+            error_code = getattr(event, 'error_code', None)
+            if error_code:
+                error_msg = event.error_message or f"Agent encountered an error ({error_code})"
+                ai_logger.error(f"Agent error detected: {error_code} - {error_msg}")
                 sse_events.append({
-                    "event": EventType.ERROR.value,
+                    "event": _EVT_ERROR,
                     "data": {
-                        "error_code": event.error_code,
+                        "error_code": error_code,
                         "message": ERROR_MESSAGE
                     }
                 })
             
             # Check for state changes
-            if hasattr(event, 'actions') and event.actions:
-                if event.actions.state_delta:
-                    ai_logger.debug(f"[EventCapture] State change detected: {str(event.actions.state_delta)[:100]}")
+            actions = getattr(event, 'actions', None)
+            if actions:
+                state_delta = actions.state_delta
+                if state_delta:
+                    # Stringified once for both the log preview and the payload
+                    state_delta_str = str(state_delta)
+                    ai_logger.debug("[EventCapture] State change detected: %.100s", state_delta_str)
                     sse_events.append({
-                        "event": EventType.STATE_CHANGE.value,
+                        "event": _EVT_STATE,
                         "data": {
-                            "state_delta": str(event.actions.state_delta),
+                            "state_delta": state_delta_str,
                             "agent": current_agent
                         }
                     })
                 
             # Check for grounding metadata (citations)
-            if hasattr(event, 'grounding_metadata') and event.grounding_metadata:
-                metadata = event.grounding_metadata
-                if hasattr(metadata, 'grounding_chunks') and metadata.grounding_chunks:
-                    ai_logger.debug(f"[EventCapture] Found {len(metadata.grounding_chunks)} grounding chunk(s)")
-                    for chunk in metadata.grounding_chunks:
+            metadata = getattr(event, 'grounding_metadata', None)
+            if metadata:
+                grounding_chunks = getattr(metadata, 'grounding_chunks', None)
+                if grounding_chunks:
+                    ai_logger.debug("[EventCapture] Found %s grounding chunk(s)", len(grounding_chunks))
+                    for chunk in grounding_chunks:
                         citation_data = {}
                         if hasattr(chunk, 'web') and chunk.web:
                             citation_data = {
@@ -427,18 +493,18 @@ class EventCapture:
                                 "uri": chunk.web.uri,
                                 "type": "web"
                             }
-                            ai_logger.debug(f"[EventCapture] Web citation: {chunk.web.title}")
+                            ai_logger.debug("[EventCapture] Web citation: %s", chunk.web.title)
                         elif hasattr(chunk, 'retrieved_context') and chunk.retrieved_context:
                             citation_data = {
                                 "title": chunk.retrieved_context.title,
                                 "uri": chunk.retrieved_context.uri,
                                 "type": "retrieval"
                             }
-                            ai_logger.debug(f"[EventCapture] Retrieval citation: {chunk.retrieved_context.title}")
+                            ai_logger.debug("[EventCapture] Retrieval citation: %s", chunk.retrieved_context.title)
                         
                         if citation_data:
                             sse_events.append({
-                                "event": EventType.CITATION.value,
+                                "event": _EVT_CITATION,
                                 "data": {
                                     "citation": citation_data,
                                     "agent": current_agent
@@ -448,14 +514,14 @@ class EventCapture:
         except Exception as e:
             ai_logger.error(f"[EventCapture] Error processing event for SSE: {str(e)}", exc_info=True)
             sse_events.append({
-                "event": EventType.ERROR.value,
+                "event": _EVT_ERROR,
                 "data": {"message": str(e)}
             })
         
-        ai_logger.debug(f"[EventCapture] Returning {len(sse_events)} SSE event(s)")
+        ai_logger.debug("[EventCapture] Returning %s SSE event(s)", len(sse_events))
         return sse_events
     
     def get_accumulated_response(self) -> str:
         """Get the accumulated response text."""
-        ai_logger.debug(f"[EventCapture] Returning accumulated response (length={len(self._accumulated_text)})")
+        ai_logger.debug("[EventCapture] Returning accumulated response (length=%s)", len(self._accumulated_text))
         return self._accumulated_text
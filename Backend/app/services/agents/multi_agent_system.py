@@ -32,6 +32,7 @@ class MultiAgentSystem:
     - Orchestrator (root agent) receives all user queries
     - Orchestrator has access to:
         - search_index tool (semantic search)
+        - search_index_batch tool (several semantic searches in one call)
         - retrieve_code_file tool (file retrieval)
         - get_indexed_files tool (list indexed files)
         - answering_agent (AgentTool) - for code explanation
@@ -41,6 +42,7 @@ class MultiAgentSystem:
     def __init__(
         self, 
         search_tool_func: Optional[Callable] = None,
+        search_batch_tool_func: Optional[Callable] = None,
         retrieve_file_func: Optional[Callable] = None,
         list_files_func: Optional[Callable] = None,
         propose_code_change_func: Optional[Callable] = None,
@@ -60,6 +62,7 @@ class MultiAgentSystem:
         
         # Store tool functions
         self._search_tool_func = search_tool_func
+        self._search_batch_tool_func = search_batch_tool_func
         self._retrieve_file_func = retrieve_file_func
         self._list_files_func = list_files_func
         self._propose_code_change_func = propose_code_change_func
@@ -157,6 +160,22 @@ class MultiAgentSystem:
         else:
             ai_logger.warning("search_tool_func not provided, search_index tool will not be available")
         
+        # Register search_index_batch tool
+        if self._search_batch_tool_func:
+            try:
+                self._tool_registry.register_function(
+                    name="search_index_batch",
+                    func=self._search_batch_tool_func,
+                    requires_confirmation=False
+                )
+                ai_logger.debug("Registered search_index_batch tool")
+                tools_registered += 1
+            except Exception as e:
+                ai_logger.error(f"Failed to register search_index_batch tool: {str(e)}", exc_info=True)
+                raise
+        else:
+            ai_logger.warning("search_batch_tool_func not provided, search_index_batch tool will not be available")
+        
         # Register retrieve_code_file tool
         if self._retrieve_file_func:
             try:
@@ -4,16 +4,28 @@ import google.genai as genai
 from google.genai import types
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
+import itertools
 import threading
 from pathlib import Path
 import pickle
 
 from app.utils.logget_setup import ai_logger as logger
-from app.core.configs.app_config import settings, INDEX_STORAGE_DIR
+from app.core.configs.app_config import settings, system_config, INDEX_STORAGE_DIR
 
 
 client = genai.Client(api_key=settings.GOOGLE_API_KEY)
 
+# Process-wide, so generations from different engine instances never collide
+_GENERATIONS = itertools.count(1)
+
+# HNSW graph parameters (neighbours per node, build/search beam widths)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Gemini accepts at most this many contents per embed_content request
+EMBED_BATCH_SIZE = 100
+
 class GeminiSearchEngineError(Exception):
     """Base exception for GeminiSearchEngine"""
     pass
@@ -50,7 +62,7 @@ class GeminiSearchEngine:
         Args:
             client: Authenticated Google GenAI client
             dimension: Embedding dimension (must match model output)
-            index_type: FAISS index type ("flat" or "ivf")
+            index_type: FAISS index type ("flat", "ivf" or "hnsw")
             max_retries: Maximum retry attempts for API calls
             
         Raises:
@@ -74,11 +86,18 @@ class GeminiSearchEngine:
             # IVF index for larger datasets (requires training)
             quantizer = faiss.IndexFlatL2(dimension)
             self.index = faiss.IndexIVFFlat(quantizer, dimension, 100)
+        elif index_type == "hnsw":
+            # Approximate graph search, sub-linear in corpus size; no training needed
+            self.index = faiss.IndexHNSWFlat(dimension, HNSW_M)
+            self.index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            self.index.hnsw.efSearch = HNSW_EF_SEARCH
         else:
             raise ValueError(f"Unknown index_type: {index_type}")
             
         self.doc_store: Dict[int, Dict[str, Any]] = {}
-        self._is_trained = (index_type == "flat")  # Flat index doesn't need training
+        self._is_trained = (index_type != "ivf")  # Only IVF needs training
+        self._loaded_dir: Optional[Path] = None  # Directory the in-memory index mirrors
+        self._generation = 0  # Bumped whenever the searchable contents change
         
         logger.debug(f"Initialized GeminiSearchEngine with dimension={dimension}, index_type={index_type}")
 
@@ -100,35 +119,59 @@ class GeminiSearchEngine:
         Raises:
             EmbeddingError: If embedding generation fails after retries
         """
-        if not text or not text.strip():
-            raise ValueError("Text cannot be empty")
+        return self._embed_texts([text], task_type=task_type)
+
+    def _embed_texts(
+        self, 
+        texts: List[str], 
+        task_type: str = "RETRIEVAL_DOCUMENT"
+    ) -> np.ndarray:
+        """
+        Embed several texts with one embed_content request per EMBED_BATCH_SIZE
+        texts, using the same retry logic as single embeddings.
+        
+        Returns:
+            (len(texts), dimension) float32 matrix, rows in input order
             
+        Raises:
+            EmbeddingError: If embedding generation fails after retries
+        """
+        if not texts or any(not text or not text.strip() for text in texts):
+            raise ValueError("Text cannot be empty")
+        
+        return np.vstack([
+            self._embed_batch(texts[i:i + EMBED_BATCH_SIZE], task_type)
+            for i in range(0, len(texts), EMBED_BATCH_SIZE)
+        ])
+
+    def _embed_batch(self, texts: List[str], task_type: str) -> np.ndarray:
+        """One embed_content call (with retries) for at most EMBED_BATCH_SIZE texts."""
         for attempt in range(self.max_retries):
             try:
                 result = self.client.models.embed_content(
                     model="models/gemini-embedding-001",
-                    contents=text,
+                    contents=texts,
                     config=types.EmbedContentConfig(
                         task_type=task_type,
                         output_dimensionality=self.dimension
                     )
                 )
                 
-                if not result or not result.embeddings:
+                if not result or not result.embeddings or len(result.embeddings) != len(texts):
                     raise EmbeddingError
                 
-                vector = np.array(
-                    result.embeddings[0].values, #type: ignore
+                vectors = np.array(
+                    [embedding.values for embedding in result.embeddings], #type: ignore
                     dtype='float32'
-                ).reshape(1, -1)
+                ).reshape(len(texts), -1)
                 
                 # Validate embedding dimension
-                if vector.shape[1] != self.dimension:
+                if vectors.shape[1] != self.dimension:
                     raise EmbeddingError(
-                        f"Expected dimension {self.dimension}, got {vector.shape[1]}"
+                        f"Expected dimension {self.dimension}, got {vectors.shape[1]}"
                     )
                     
-                return vector
+                return vectors
                 
             except Exception as e:
                 logger.warning(
@@ -177,6 +220,7 @@ class GeminiSearchEngine:
                     "id": doc_id,
                     "content": searchable_text
                 }
+                self._generation = next(_GENERATIONS)
                 
             logger.debug(f"Document {doc_id} indexed successfully with internal ID {faiss_id}")
             return faiss_id
@@ -216,32 +260,90 @@ class GeminiSearchEngine:
             
         logger.debug(f"Searching for: '{query_text[:50]}...' (top_k={top_k})")
         
-        try:
-            # Generate query embedding
-            query_vec = self._embed_text(query_text, task_type="RETRIEVAL_QUERY")
+        # Generate query embedding
+        query_vec = self.embed_query(query_text)
+        return self.search_by_vector(query_vec, top_k=top_k)
+
+    def embed_query(self, query_text: str) -> np.ndarray:
+        """
+        Embed a search query (RETRIEVAL_QUERY task type).
+        
+        Raises:
+            EmbeddingError: If query embedding fails
+        """
+        return self._embed_text(query_text, task_type="RETRIEVAL_QUERY")
+
+    def embed_queries(self, query_texts: List[str]) -> np.ndarray:
+        """
+        Embed several search queries into one (nq, dimension) matrix.
+        
+        Raises:
+            EmbeddingError: If any query embedding fails
+        """
+        # One embed_content request for the whole batch, not one per query
+        return self._embed_texts(query_texts, task_type="RETRIEVAL_QUERY")
+
+    def search_by_vector(
+        self, 
+        query_vec: np.ndarray, 
+        top_k: int = 3
+    ) -> List[Dict[str, Any]]:
+        """
+        Search with an already-computed query embedding (see embed_query).
+        
+        Returns:
+            List of search results with score, id, and document
             
-            # Search FAISS index
+        Raises:
+            RuntimeError: If the FAISS search fails
+        """
+        return self.search_by_vectors(query_vec, top_k=top_k)[0]
+
+    def search_by_vectors(
+        self, 
+        query_vecs: np.ndarray, 
+        top_k: int = 3
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search several query embeddings with a single FAISS call.
+        
+        Args:
+            query_vecs: (nq, dimension) matrix of query embeddings
+            top_k: Number of results per query
+            
+        Returns:
+            One result list per query row, each shaped like search()'s output
+            
+        Raises:
+            RuntimeError: If the FAISS search fails
+        """
+        if self.index.ntotal == 0:
+            return [[] for _ in range(len(query_vecs))]
+        
+        try:
+            # Search FAISS index (one matrix-matrix distance pass for all rows)
             with self._lock:
-                distances, indices = self.index.search(query_vec, k=top_k) #type: ignore
+                distances, indices = self.index.search(query_vecs, k=top_k) #type: ignore
             
             # Format results
-            results = []
-            for dist, idx in zip(distances[0], indices[0]):
-                if idx != -1 and idx in self.doc_store:
-                    doc = self.doc_store[idx]
-                    results.append({
-                        "score": float(dist),
-                        "id": doc["id"],
-                        "document": doc["content"]
-                    })
-                elif idx != -1:
-                    logger.warning(f"Index {idx} not found in doc_store")
+            batch = []
+            for row_dist, row_idx in zip(distances, indices):
+                results = []
+                for dist, idx in zip(row_dist, row_idx):
+                    if idx != -1 and idx in self.doc_store:
+                        doc = self.doc_store[idx]
+                        results.append({
+                            "score": float(dist),
+                            "id": doc["id"],
+                            "document": doc["content"]
+                        })
+                    elif idx != -1:
+                        logger.warning(f"Index {idx} not found in doc_store")
+                batch.append(results)
                     
-            logger.debug(f"Search returned {len(results)} results")
-            return results
+            logger.debug(f"Search returned {sum(len(r) for r in batch)} results for {len(batch)} queries")
+            return batch
             
-        except EmbeddingError:
-            raise
         except Exception as e:
             logger.error(f"Search failed: {e}")
             raise RuntimeError(f"Search operation failed: {e}") from e
@@ -276,11 +378,19 @@ class GeminiSearchEngine:
             for faiss_id, doc_data in list(self.doc_store.items()):
                 if doc_data["id"] == doc_id:
                     del self.doc_store[faiss_id]
+                    self._generation = next(_GENERATIONS)
                     logger.debug(f"Deleted document: {doc_id}")
                     return True
         logger.warning(f"Document not found for deletion: {doc_id}")
         return False
 
+    @staticmethod
+    def storage_dir(folder_id: Optional[str] = None) -> Path:
+        """Directory holding faiss.index/doc_store.pkl for a folder (or the default location)."""
+        if folder_id:
+            return INDEX_STORAGE_DIR / f"faiss_{folder_id}"
+        return INDEX_STORAGE_DIR
+
     def save(self, folder_id: Optional[str] = None) -> None:
         """
         Persist index and document store to disk.
@@ -290,10 +400,7 @@ class GeminiSearchEngine:
                        If provided, saves to faiss_{folder_id}/
                        If None, saves to default location.
         """
-        if folder_id:
-            dir_path = INDEX_STORAGE_DIR / f"faiss_{folder_id}"
-        else:
-            dir_path = INDEX_STORAGE_DIR
+        dir_path = self.storage_dir(folder_id)
         
         dir_path.mkdir(parents=True, exist_ok=True)
         
@@ -306,25 +413,31 @@ class GeminiSearchEngine:
             store_path = dir_path / "doc_store.pkl"
             with open(store_path, 'wb') as f:
                 pickle.dump(self.doc_store, f)
+            
+            self._loaded_dir = dir_path
                 
         logger.debug(f"Index saved to {dir_path}")
 
-    def load(self, folder_id: Optional[str] = None) -> bool:
+    def load(self, folder_id: Optional[str] = None, force: bool = False) -> bool:
         """
         Populates the current instance with data from disk.
         
+        A no-op if the instance already holds this location's index,
+        unless force is set.
+        
         Args:
             folder_id: Optional folder ID for per-folder storage.
                        If provided, loads from faiss_{folder_id}/
                        If None, loads from default location.
+            force: Re-read the files even if this location is already loaded.
         
         Returns:
             True if successful, False if files don't exist.
         """
-        if folder_id:
-            dir_path = INDEX_STORAGE_DIR / f"faiss_{folder_id}"
-        else:
-            dir_path = INDEX_STORAGE_DIR
+        dir_path = self.storage_dir(folder_id)
+        
+        if not force and self._loaded_dir == dir_path:
+            return True
             
         index_path = dir_path / "faiss.index"
         store_path = dir_path / "doc_store.pkl"
@@ -340,10 +453,24 @@ class GeminiSearchEngine:
             # Load Document Store
             with open(store_path, 'rb') as f:
                 self.doc_store = pickle.load(f)
+            
+            self._loaded_dir = dir_path
+            self._generation = next(_GENERATIONS)
                 
         logger.info(f"Index loaded from {dir_path}. Total documents: {len(self)}")
         return True
 
+    def ensure_loaded(self) -> bool:
+        """
+        Load the default index on first use.
+        
+        A no-op once any index has been loaded or documents were added, so it
+        never replaces a folder index selected with load(folder_id).
+        """
+        if self._loaded_dir is not None or self.index.ntotal:
+            return True
+        return self.load()
+
     def get_stats(self) -> Dict[str, Any]:
         """
         Get index statistics.
@@ -358,6 +485,11 @@ class GeminiSearchEngine:
                 "doc_store_size": len(self.doc_store)
             }
 
+    @property
+    def generation(self) -> int:
+        """Changes whenever documents are added, deleted or a different index is loaded; unique across engines."""
+        return self._generation
+
     def __len__(self) -> int:
         """Return number of indexed documents"""
         return self.index.ntotal
@@ -366,4 +498,5 @@ class GeminiSearchEngine:
         return f"GeminiSearchEngine(documents={len(self)}, dimension={self.dimension})"
     
 
-gemini_search_engine = GeminiSearchEngine()
\ No newline at end of file
+# Exact flat search by default; SEARCH_INDEX_TYPE: "hnsw" switches to ANN for large corpora
+gemini_search_engine = GeminiSearchEngine(index_type=system_config.get("SEARCH_INDEX_TYPE", "flat"))
\ No newline at end of file
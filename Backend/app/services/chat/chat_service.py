@@ -15,7 +15,7 @@ from app.utils.logget_setup import app_logger
 from app.core.configs.app_config import settings
 from app.services.agents.agent_config import session_manager
 from app.services.agents.multi_agent_system import MultiAgentSystem
-from app.services.agents.agent_tools import search_index, retrieve_code_file, get_indexed_files, propose_code_change, load_index_for_folder
+from app.services.agents.agent_tools import search_index, search_index_batch, retrieve_code_file, get_indexed_files, propose_code_change, load_index_for_folder
 from app.services.agents.event_capture import ExecutionTrace, EventCapture, EventType
 
 
@@ -40,6 +40,7 @@ class ChatService:
             # Create multi-agent system with all tools
             self._multi_agent_system = MultiAgentSystem(
                 search_tool_func=search_index,
+                search_batch_tool_func=search_index_batch,
                 retrieve_file_func=retrieve_code_file,
                 list_files_func=get_indexed_files,
                 propose_code_change_func=propose_code_change,
@@ -0,0 +1,57 @@
+"""
+Async TTL Cache
+Memoizes async GitHub fetchers for a short window and shares one in-flight
+call between concurrent callers for the same arguments.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from functools import wraps
+
+
+def async_ttl_cache(ttl: float = 60, maxsize: int = 512):
+    """
+    Cache an async function's results per positional/keyword arguments.
+    
+    Entries expire after `ttl` seconds; the least recently used entry is
+    evicted past `maxsize`. Exceptions and None results are not cached.
+    """
+    def decorator(func):
+        # key -> (expires_at, task); the task is shared by concurrent callers
+        cache: OrderedDict = OrderedDict()
+        
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            
+            entry = cache.get(key)
+            if entry is not None and entry[0] > now:
+                cache.move_to_end(key)
+                task = entry[1]
+            else:
+                task = asyncio.ensure_future(func(*args, **kwargs))
+                cache[key] = (now + ttl, task)
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            
+            try:
+                # Shield so one cancelled caller doesn't cancel the shared fetch
+                result = await asyncio.shield(task)
+            except Exception:
+                _evict(key, task)
+                raise
+            
+            if result is None:
+                _evict(key, task)
+            return result
+        
+        def _evict(key, task):
+            entry = cache.get(key)
+            if entry is not None and entry[1] is task:
+                del cache[key]
+        
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    
+    return decorator
@@ -0,0 +1,66 @@
+"""
+Single-flight event streams
+Lets concurrent callers with the same key share one running async generator,
+each receiving the events produced after they joined.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Callable, Hashable
+
+# key -> subscriber queues of the running producer
+_inflight: dict[Hashable, list[asyncio.Queue]] = {}
+_tasks: set[asyncio.Task] = set()
+
+
+class _Finished:
+    """End-of-stream marker, carrying the producer's exception if it failed."""
+    __slots__ = ("error",)
+    
+    def __init__(self, error: BaseException | None = None):
+        self.error = error
+
+
+async def _fan_out(key: Hashable, events: AsyncIterator[Any], subscribers: list[asyncio.Queue]):
+    finished = _Finished()
+    try:
+        async for event in events:
+            for queue in list(subscribers):
+                await queue.put(event)
+    except Exception as e:
+        finished = _Finished(e)
+    finally:
+        _inflight.pop(key, None)
+        for queue in list(subscribers):
+            await queue.put(finished)
+
+
+async def single_flight(key: Hashable, factory: Callable[[], AsyncIterator[Any]], maxsize: int = 64):
+    """
+    Yield events from `factory()`, starting it only if no stream for `key` is running.
+    
+    Each subscriber gets a bounded queue, so a slow reader applies backpressure
+    to the shared producer instead of buffering without limit.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    subscribers = _inflight.get(key)
+    if subscribers is None:
+        subscribers = _inflight[key] = [queue]
+        task = asyncio.create_task(_fan_out(key, factory(), subscribers))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    else:
+        subscribers.append(queue)
+    
+    try:
+        while True:
+            item = await queue.get()
+            if isinstance(item, _Finished):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        if queue in subscribers:
+            subscribers.remove(queue)
+        # Free any put() the producer is blocked on for this queue
+        while not queue.empty():
+            queue.get_nowait()
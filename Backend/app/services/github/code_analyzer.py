@@ -8,6 +8,8 @@ from pydantic import BaseModel
 import json
 import asyncio
 
+import orjson
+
 from google.adk.agents import Agent, LoopAgent
 from google.adk.sessions import BaseSessionService
 from google.adk.runners import Runner
@@ -25,8 +27,9 @@ from app.services.ai_search.search_service import gemini_search_engine
 # FILE INDEXER
 
 # ---------- DEFAULT IGNORE ----------
-DEFAULT_IGNORE = helper_config["default_ignore"]
-IGNORE_EXTS  = helper_config["ignore_extensions"]
+# frozensets: these are probed once per directory entry during indexing
+DEFAULT_IGNORE = frozenset(helper_config["default_ignore"])
+IGNORE_EXTS  = frozenset(helper_config["ignore_extensions"])
 
 REPO_ANALYSIS_PROMPT = prompt_config.get("REPO_ANALYSIS_PROMPT")
 
@@ -96,6 +99,39 @@ def matches_ignore(path: Path, patterns: Set[str]) -> bool:
     return False
 
 
+def repo_snapshot_key(repo_path: str) -> str:
+    """
+    Cheap version key for a repository tree.
+
+    Hashes the sorted (relative_path, mtime_ns, size) of every file without
+    reading contents, so an unchanged checkout always yields the same key.
+    """
+    entries = []
+    stack = [("", repo_path)]
+
+    while stack:
+        prefix, directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name in DEFAULT_IGNORE:
+                        continue
+                    rel = prefix + entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((rel + "/", entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        entries.append(f"{rel}\0{st.st_mtime_ns}\0{st.st_size}")
+        except OSError:
+            continue
+
+    digest = hashlib.blake2b(digest_size=16)
+    for line in sorted(entries):
+        digest.update(line.encode("utf-8", "surrogateescape"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
 # ---------- MAIN FUNCTION ----------
 def build_file_index(repo_path: str) -> List[FileInfo]:
     try:
@@ -358,7 +394,7 @@ async def _analyze_chunk(agent: Agent, chunk_id: str, folder_id: str, user_id: s
     session_id = str(uuid.uuid4())
     
     try:
-        chunk_data = read_chunk(chunk_id, folder_id)
+        chunk_data = read_chunk(chunk_id, folder_id, user_id)
         
         user_content = types.Content(
             role="user",
@@ -451,7 +487,7 @@ async def _analyze_chunk(agent: Agent, chunk_id: str, folder_id: str, user_id: s
             except Exception as cleanup_error:
                 ai_logger.error(f"[{chunk_id}] Failed to delete session: {cleanup_error}")
 
-def read_chunk(chunk_id: str, session_id: str):
+def read_chunk(chunk_id: str, session_id: str, user_id: str):
     """
     Load and return the text content for all files associated with a chunk
     within a given session.
@@ -459,6 +495,7 @@ def read_chunk(chunk_id: str, session_id: str):
     Args:
         chunk_id (str): Unique identifier of the chunk to read.
         session_id (str): Session identifier used to locate chunk and index data.
+        user_id (str): Owner of the stored repository.
 
     Returns:
         dict:
@@ -470,30 +507,35 @@ def read_chunk(chunk_id: str, session_id: str):
             }
     """
     try:
-        user_id = "918262"
-        chunk_file_path = Path(REPO_STORAGE) / str(user_id) / "chunks" / f"chunk_{session_id}.json"
-        indexed_file_path = Path(REPO_STORAGE) / str(user_id) / "indexed_file" / f"file_index_{session_id}.json"
+        chunk_file_path = Path(REPO_STORAGE) / str(user_id) / "chunks" / f"chunk_{session_id}.jsonl"
+        indexed_file_path = Path(REPO_STORAGE) / str(user_id) / "indexed_file" / f"file_index_{session_id}.jsonl"
         
         # load chunk data
         if not chunk_file_path.exists():
             ai_logger.error("Chunk file not found: %s", chunk_file_path)
             return {"status": "failed", "message": "Chunk file not found", "data": ""}
 
+        # get the specific chunk (one chunk per line, stop at the first match)
+        target = None
         try:
-            chunk_data = json.loads(chunk_file_path.read_text(encoding="utf-8"))
+            with chunk_file_path.open("rb") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    chunk = orjson.loads(line)
+                    if chunk.get("chunk_id") == chunk_id:
+                        target = chunk
+                        break
         except Exception as e:
             ai_logger.exception("Failed to read chunk file: %s", e)
             return {"status": "failed", "message": "Failed to load chunks!", "data": ""}
-
-        # get the specific chunk
-        # ai_logger.info(chunk_data)
-        target = next((c for c in chunk_data if c.get("chunk_id") == chunk_id), None)
         
         if not target:
             return {"status": "failed", "message": f"Chunk ID: {chunk_id} not found", "data": ""}
         
         # load index map: relative → absolute
-        indexed = json.loads(indexed_file_path.read_text(encoding="utf-8"))
+        with indexed_file_path.open("rb") as f:
+            indexed = [orjson.loads(line) for line in f if line.strip()]
         index_map = {e["relative_path"]: e["path"] for e in indexed}
 
         files_content = {}
@@ -545,7 +587,7 @@ def save_chunk_to_session(
         session_path.parent.mkdir(parents=True, exist_ok=True)
 
         if session_path.exists():
-            data = json.loads(session_path.read_text(encoding="utf-8"))
+            data = orjson.loads(session_path.read_bytes())
         else:
             data = {
                 "folder_id": folder_id,
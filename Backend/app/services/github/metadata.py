@@ -5,6 +5,7 @@ Fetches repository statistics from GitHub API (public repos only, no auth requir
 from typing import Optional, Dict, Any
 from app.utils.logget_setup import app_logger
 from app.utils import custom_request
+from app.services.github._cache import async_ttl_cache
 
 
 # GitHub-specific headers
@@ -13,6 +14,7 @@ GITHUB_HEADERS = {
 }
 
 
+@async_ttl_cache(ttl=60)
 async def fetch_repo_metadata(owner: str, repo: str) -> Optional[Dict[str, Any]]:
     """
     Fetch repository metadata from GitHub API.
@@ -58,10 +60,12 @@ async def fetch_repo_metadata(owner: str, repo: str) -> Optional[Dict[str, Any]]
         return None
 
 
-async def fetch_branch_count(owner: str, repo: str) -> int:
+@async_ttl_cache(ttl=60)
+async def fetch_branch_count(owner: str, repo: str) -> Optional[int]:
     """
     Fetch the number of branches for a repository.
     Uses pagination to get accurate count for repos with many branches.
+    Returns None if the request fails, so the failure isn't cached.
     """
     url = f"https://api.github.com/repos/{owner}/{repo}/branches"
     
@@ -72,7 +76,7 @@ async def fetch_branch_count(owner: str, repo: str) -> int:
     )
     
     if response is None:
-        return 0
+        return None
         
     if response.status_code == 200:
         # Check Link header for total count
@@ -88,4 +92,5 @@ async def fetch_branch_count(owner: str, repo: str) -> int:
         branches = response.json()
         return len(branches)
     
-    return 0
+    app_logger.warning(f"GitHub API error fetching branches: {response.status_code}")
+    return None
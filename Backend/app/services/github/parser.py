@@ -1,5 +1,6 @@
 import re
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Dict, Tuple
 from urllib.parse import urlparse, unquote
 from app.utils.logget_setup import app_logger
@@ -192,6 +193,13 @@ def extract_github_info_with_error(url: str) -> Tuple[Optional[dict], Optional[s
     if not isinstance(url, str):
         return None, "Invalid input type"
 
+    # Parsing is pure, so repeat URLs hit the cache; callers get their own copy to mutate
+    result, error_msg = _extract_github_info_with_error_cached(url)
+    return (dict(result) if result is not None else None), error_msg
+
+
+@lru_cache(maxsize=1024)
+def _extract_github_info_with_error_cached(url: str) -> Tuple[Optional[dict], Optional[str]]:
     url = url.strip()
     
     if not url:
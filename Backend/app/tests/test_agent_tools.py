@@ -0,0 +1,49 @@
+import os
+import sys
+import pytest
+
+# Ensure the repository's Backend folder is on sys.path so `app` is importable in tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app.services.agents import agent_tools
+
+
+def test_format_file_window(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text("one\ntwo\nthree\nfour\n")
+    got = agent_tools._format_file(path, "a.py", start_line=1, max_lines=2)
+    assert got == "━━━ a.py (lines 2-3) ━━━\ntwo\nthree\n"
+
+
+def test_format_file_window_past_eof(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text("one\ntwo\n")
+    got = agent_tools._format_file(path, "a.py", start_line=5, max_lines=10)
+    assert got == "start_line 5 is beyond end of file (2 lines)."
+
+
+def test_resolve_file_prefers_user_storage_over_cwd(tmp_path, monkeypatch):
+    storage = tmp_path / "storage"
+    stored = storage / "user1" / "repo" / "requirements.txt"
+    stored.parent.mkdir(parents=True)
+    stored.write_text("stored\n")
+    cwd = tmp_path / "cwd"
+    cwd.mkdir()
+    (cwd / "requirements.txt").write_text("server\n")
+    monkeypatch.setattr(agent_tools, "REPO_STORAGE", str(storage))
+    monkeypatch.chdir(cwd)
+    
+    got = agent_tools._resolve_file("user1", "requirements.txt")
+    assert got is not None
+    assert os.path.realpath(got) == os.path.realpath(stored)
+
+
+def test_format_result_non_string_summary():
+    doc = {"file": "a.py", "purpose": None, "summary": ["parses", "urls"], "functions": ["f", "g"]}
+    got = agent_tools._format_result(1, {"score": 0.5, "id": "c1"}, doc)
+    assert got.splitlines() == [
+        "━━━ Result 1 (relevance: 0.50) ━━━",
+        agent_tools._L_FILE + "a.py",
+        "📝 Summary: ['parses', 'urls']",
+        "⚙️ Functions: f, g",
+    ]
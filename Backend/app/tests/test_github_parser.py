@@ -54,3 +54,12 @@ def test_raw_githubusercontent():
 
 def test_invalid_url_returns_none():
     assert parser.extract_github_info("not a url") is None
+
+
+def test_with_error_returns_fresh_dict_per_call():
+    url = "https://github.com/owner/repo"
+    first, _ = parser.extract_github_info_with_error(url)
+    first["stars"] = 10
+    second, error = parser.extract_github_info_with_error(url)
+    assert error is None
+    assert "stars" not in second
@@ -0,0 +1,43 @@
+"""
+Hot helper loops
+Small, strictly typed helpers that import nothing beyond the stdlib and the
+app logger, so the module can be compiled ahead of time (e.g. with mypyc)
+without touching call sites.
+"""
+import os
+from typing import Iterator
+
+from app.utils.logget_setup import app_logger
+
+
+def _walk(root: str, ignore: frozenset[str], prefix: str = "") -> Iterator[tuple[str, str]]:
+    """
+    Yield (absolute_path, arcname) for every file under root.
+    
+    Ignored and hidden entries are pruned at the directory level,
+    so skipped subtrees are never listed.
+    """
+    try:
+        with os.scandir(root) as entries:
+            for entry in entries:
+                name: str = entry.name
+                # DirEntry names are never empty, so name[0] is a safe dot check
+                if name in ignore or name[0] == ".":
+                    continue
+                
+                arcname: str = prefix + name
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _walk(entry.path, ignore, arcname + "/")
+                elif entry.is_file():
+                    yield entry.path, arcname
+    except OSError as e:
+        app_logger.warning(f"Could not read directory {root}: {e}")
+
+
+def _classify_relevance(distance: float) -> str:
+    """Relevance label for an L2 distance; lower distance = higher relevance."""
+    if distance < 0.5:
+        return "high"
+    if distance < 1.0:
+        return "medium"
+    return "low"
@@ -0,0 +1,20 @@
+"""
+orjson-backed JSON response
+Drop-in replacement for FastAPI's JSONResponse using orjson for serialization
+"""
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse that renders its content with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+def json_response(content: Any, status_code: int = 200) -> Response:
+    """Build a JSON response with orjson, skipping the JSONResponse render step."""
+    return Response(orjson.dumps(content), status_code=status_code, media_type="application/json")
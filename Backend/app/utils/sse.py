@@ -0,0 +1,36 @@
+"""
+Pre-encoded SSE framing
+Builds Server-Sent Event frames as bytes so the hot streaming paths skip
+per-event str formatting and the utf-8 re-encode at the transport layer.
+"""
+from typing import Any
+
+import orjson
+
+_END = b"\n\n"
+_EVT_TOKEN = b"event: token\ndata: "
+_EVT_PROGRESS = b"event: progress\ndata: "
+_EVT_METADATA = b"event: metadata\ndata: "
+_EVT_COMPLETE = b"event: complete\ndata: "
+_EVT_ERROR = b"event: error\ndata: "
+
+# event type -> b"event: <type>\ndata: "; known types are preset, others filled on first use
+_prefixes: dict[str, bytes] = {
+    "token": _EVT_TOKEN,
+    "progress": _EVT_PROGRESS,
+    "metadata": _EVT_METADATA,
+    "complete": _EVT_COMPLETE,
+    "error": _EVT_ERROR,
+}
+
+
+def _prefix(event: str) -> bytes:
+    prefix = _prefixes.get(event)
+    if prefix is None:
+        prefix = _prefixes[event] = f"event: {event}\ndata: ".encode()
+    return prefix
+
+
+def sse_frame(event: str, data: Any) -> bytes:
+    """Return a complete SSE frame for `event` with `data` serialized by orjson."""
+    return _prefix(event) + orjson.dumps(data) + _END
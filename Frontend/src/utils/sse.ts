@@ -66,29 +66,39 @@ export const streamSSE = async (
           const jsonStr = line.substring(5).trim();
           if (!jsonStr) continue;
 
+          let streamFailed = false;
           try {
-            const data = JSON.parse(jsonStr);
-            // console.log(`[SSE Parser] Data:`, data);
-
-            // Generic event handler
-            callbacks.onEvent?.(lastEventType, data);
-
-            // Specific event handlers for backward compatibility
-            const eventType = lastEventType !== "message" ? lastEventType : data.event;
-            
-            if (eventType === "progress") {
-              callbacks.onProgress?.(data.percent || 0, data.message || "");
-            } else if (eventType === "metadata" || (!eventType && data.owner)) {
-              callbacks.onMetadata?.(data);
-            } else if (eventType === "complete") {
-              callbacks.onComplete?.(data);
-            } else if (eventType === "error") {
-              const msg = data.message || "An error occurred";
-              callbacks.onError?.(msg);
-              throw new Error(msg);
+            const parsed = JSON.parse(jsonStr);
+            // console.log(`[SSE Parser] Data:`, parsed);
+
+            // progress_batch frames carry several events; unroll them in order
+            const events: [string, any][] =
+              lastEventType === "progress_batch" && Array.isArray(parsed)
+                ? parsed.map((item: any) => [item.event || "progress", item])
+                : [[lastEventType, parsed]];
+
+            for (const [frameEvent, data] of events) {
+              // Generic event handler
+              callbacks.onEvent?.(frameEvent, data);
+
+              // Specific event handlers for backward compatibility
+              const eventType = frameEvent !== "message" ? frameEvent : data.event;
+              
+              if (eventType === "progress") {
+                callbacks.onProgress?.(data.percent || 0, data.message || "");
+              } else if (eventType === "metadata" || (!eventType && data.owner)) {
+                callbacks.onMetadata?.(data);
+              } else if (eventType === "complete") {
+                callbacks.onComplete?.(data);
+              } else if (eventType === "error") {
+                const msg = data.message || "An error occurred";
+                callbacks.onError?.(msg);
+                streamFailed = true;
+                throw new Error(msg);
+              }
             }
           } catch (parseErr: any) {
-            if (lastEventType === "error") throw parseErr;
+            if (streamFailed || lastEventType === "error") throw parseErr;
             console.error("SSE JSON parse error:", parseErr, "Line:", line);
           }
         }